@@ -5,3 +5,8 @@ except ImportError:
     from pkgutil import extend_path
     __path__ = extend_path(__path__, __name__)
 
+
+def warmup(verbose=True):
+    """Compiles all the numba kernels ahead of time and fills the cache (see `picaso.precompile.warmup`)"""
+    from .precompile import warmup
+    return warmup(verbose=verbose)
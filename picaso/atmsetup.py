@@ -1,17 +1,18 @@
 from .elements import ELEMENTS as ele 
 import json 
 import os
-from .io_utils import read_json
+from .io_utils import read_json, read_3d_input
 import astropy.units as u
 import astropy.constants as c
 import pandas as pd
 import warnings 
 import numpy as np
-from .wavelength import get_cld_input_grid, regrid
+from .wavelength import get_cld_input_grid, regrid, get_regrid_weights
 from numba import jit
-import h5py
 import pysynphot as psyn
 import math 
+import hashlib
+import copy
 
 __refdata__ = os.environ.get('picaso_refdata')
 
@@ -35,6 +36,11 @@ class ATMSETUP():
 		self.planet = type('planet', (object,),{})
 		self.layer = {}
 		self.level = {}
+		#quantities that have to be recomputed after a setter, see `update`
+		self.dirty = set()
+		self.changed_layers = np.array([], dtype=int)
+		#opacity class that holds this atmosphere's current opacities, see `optics.get_opacities`
+		self.opacity_class = None
 		self.get_constants()
 
 	def get_constants(self):
@@ -62,7 +68,7 @@ class ATMSETUP():
 
 		return
 
-	def get_profile_3d(self):
+	def get_profile_3d(self, columns=None):
 		"""
 		A separate routine is written to get the 3d profile because the inputs are much more 
 		rigid. In this framework, the following restrictions are placed: 
@@ -72,87 +78,62 @@ class ATMSETUP():
 		The input must be in hdf5 format. The tutorial for 3d calculations 
 		can help guid you to make these files correctly. 
 
+		Parameters
+		----------
+		columns : tuple 
+			(Optional) (data, header) to use instead of the input file, where data is 
+			(ncolumn, nlevel, ncol) (e.g. from `gcm_regrid.get_gcm_columns`). Each column is 
+			stored as its own facet, so the atmosphere is (ncolumn x 1) facets. 
 		"""
 		#SET DIMENSIONALITY 
 		self.dimension = '3d'
 
 		chemistry_input = self.input['atmosphere']
-		h5db = h5py.File(chemistry_input['profile']['filepath'],'r',swmr=True)
-		#get header of columns
-		header = h5db.attrs['header'].split(',')
-
-		iheader = list(range(len(header)))
-
-		#get all the gangles 
-		self.gangles = [i for i in h5db.keys()]
-		ng = self.c.ngangle
-		#get all the tangles 
-		self.tangles = [i for i in h5db[self.gangles[0]].keys()]
-		nt = self.c.ntangle
+		if columns is None:
+			#(ng, nt, nlevel, ncolumn) values, read in one go 
+			data, header, self.gangles, self.tangles = read_3d_input(chemistry_input['profile']['filepath'])
+			ng = self.c.ngangle
+			nt = self.c.ntangle
+			if (len(self.gangles) != ng) or (len(self.tangles) != nt): 
+				raise Exception("3d input has %i gauss and %i tchebyshev angles but %i and %i were requested in phase_angle" 
+					% (len(self.gangles), len(self.tangles), ng, nt))
+		else: 
+			data, header = columns
+			data = np.asarray(data, dtype=float)[:,np.newaxis]
+			self.c.ngangle, self.c.ntangle = data.shape[:2]
+			self.gangles, self.tangles = None, None
 
-		nlevel = h5db[str(self.gangles[0])][str(self.tangles[0])].shape[0]
+		nlevel = data.shape[2]
 		self.c.nlevel = nlevel
 		self.c.nlayer = nlevel-1
 
-		#fill empty arrays for everything
-		self.level['temperature'] = np.zeros((nlevel, ng, nt))
-		self.level['pressure'] = np.zeros((nlevel, ng, nt))
-		self.layer['temperature'] = np.zeros((nlevel-1, ng, nt))
-		self.layer['pressure'] = np.zeros((nlevel-1, ng, nt))
-
-		if 'e-' in header:
-
-			electron=True
-			#check to see if there is an electron
-			self.level['electrons'] = np.zeros((nlevel, ng, nt))
-			self.layer['electrons'] = np.zeros((nlevel-1, ng, nt))
-			ielec = np.where('e-' == np.array(header))[0][0]
-		else: 
-			electron=False		
-
-		first = True
-		#loop over gangles 
-		for g in range(self.c.ngangle):
-			#loop over tangles 
-			for t in range(self.c.ntangle):
-				if first:
-					#on first pass find index where temperature and pressure are located
-					itemp = np.where('temperature' == np.array(header))[0][0]
-					ipress = np.where('pressure' == np.array(header))[0][0]
-					iheader.pop(ielec)
-					iheader.pop(itemp)
-					iheader.pop(ipress)
-
-					#after getting rid of electrons, temperature and pressure the rest should 
-					#represent the number of molecules 
-					num_mol = len(iheader)
-					self.level['mixingratios'] = np.zeros((nlevel, num_mol, ng, nt))
-					self.layer['mixingratios'] = np.zeros((nlevel-1, num_mol, ng, nt))
-
-					self.weights = pd.DataFrame({})
-					self.molecules=[]
-					for i in iheader:
-
-						self.weights[header[i]] = pd.Series([self.get_weights([header[i]])[header[i]]])
-						self.molecules += [header[i]]
+		#on the first pass find the columns of temperature and pressure and electrons, 
+		#the rest should represent the molecules 
+		itemp = header.index('temperature')
+		ipress = header.index('pressure')
+		electron = 'e-' in header
+		iheader = [i for i in range(len(header)) if header[i] not in ['temperature','pressure','e-']]
 
-					first = False
+		self.molecules = [header[i] for i in iheader]
+		self.species_index = {m: i for i, m in enumerate(self.molecules)}
+		self.weights = np.array([self.get_weights([m])[m] for m in self.molecules])
 
-				if electron: 
-					#if there is an electron column, fill in the values 
-					self.level['electrons'][:,g,t] = h5db[self.gangles[g]][self.tangles[t]].value[:,ielec]
-					self.layer['electrons'][:,g,t] = 0.5*(self.level['electrons'][1:,g,t] + self.level['electrons'][:-1,g,t])
+		#everything below is stored (nlevel, ..., ng, nt)
+		data = np.moveaxis(data, (0,1), (-2,-1))
 
-				self.level['temperature'][:,g,t] = h5db[self.gangles[g]][self.tangles[t]].value[:,itemp]
-				self.layer['temperature'][:,g,t] = 0.5*(self.level['temperature'][1:,g,t] + self.level['temperature'][:-1,g,t])
+		self.level['temperature'] = data[:,itemp]
+		self.layer['temperature'] = 0.5*(self.level['temperature'][1:] + self.level['temperature'][:-1])
 
-				self.level['pressure'][:,g,t] = h5db[self.gangles[g]][self.tangles[t]].value[:,ipress]*self.c.pconv #CONVERTING BARS TO DYN/CM2
-				self.layer['pressure'][:,g,t] = np.sqrt(self.level['pressure'][1:,g,t] * self.level['pressure'][:-1,g,t])
+		self.level['pressure'] = data[:,ipress]*self.c.pconv #CONVERTING BARS TO DYN/CM2
+		self.layer['pressure'] = np.sqrt(self.level['pressure'][1:] * self.level['pressure'][:-1])
 
+		if electron: 
+			#if there is an electron column, fill in the values 
+			self.level['electrons'] = data[:,header.index('e-')]
+			self.layer['electrons'] = 0.5*(self.level['electrons'][1:] + self.level['electrons'][:-1])
 
-				self.level['mixingratios'][:,:,g,t] = h5db[self.gangles[g]][self.tangles[t]].value[:,iheader]
-				self.layer['mixingratios'][:,:,g,t] = 0.5*(self.level['mixingratios'][1:,:,g,t] + self.level['mixingratios'][:-1,:,g,t])
-
+		self.level['mixingratios'] = data[:,iheader]
+		self.layer['mixingratios'] = 0.5*(self.level['mixingratios'][1:] + self.level['mixingratios'][:-1])
 
 	def get_profile(self):
 		"""
@@ -173,7 +154,7 @@ class ATMSETUP():
 
 		
 		#COMPUTE THE MOLECULAT WEIGHTS OF THE MOLECULES
-		weights = pd.DataFrame({})
+		weights = {}
 
 		#Cycle through each column
 		self.molecules = np.array([],dtype=str)
@@ -181,7 +162,7 @@ class ATMSETUP():
 		for i in read.keys():
 			if i in ['pressure', 'temperature']: continue
 			try:
-				weights[i] = pd.Series([self.get_weights([i])[i]])
+				weights[i] = self.get_weights([i])[i]
 				self.molecules = np.concatenate((self.molecules ,np.array([i])))
 			except:
 				if i == 'e-':
@@ -191,12 +172,13 @@ class ATMSETUP():
 					self.add_warnings("Ignoring %s in input file, not recognized molecule" % i)
 					warnings.warn("Ignoring %s in input file, not a recognized molecule" % i, UserWarning)
 		
-		self.weights = weights 
+		#species are the columns of the mixing ratio arrays, in the order of the input
+		self.species_index = {m: i for i, m in enumerate(weights.keys())}
+		self.weights = np.array(list(weights.values()), dtype=float)
 
 		#DEFINE MIXING RATIOS
-		self.level['mixingratios'] = read[list(weights.keys())]
-		self.layer['mixingratios'] = 0.5*(self.level['mixingratios'][1:].reset_index(drop=True) + 
-     						self.level['mixingratios'][0:-1].reset_index(drop=True))
+		self.level['mixingratios'] = np.array(read[list(weights.keys())].values, dtype=float, order='C')
+		self.layer['mixingratios'] = 0.5*(self.level['mixingratios'][1:] + self.level['mixingratios'][:-1])
 
 		#GET TP PROFILE 
 		#if parameterization is needed?
@@ -319,12 +301,12 @@ class ATMSETUP():
 		Returns the mean molecular weight of the atmosphere 
 		"""
 		if self.dimension=='1d':
-			weighted_matrix = self.level['mixingratios'].values @ self.weights.values[0]
+			weighted_matrix = self.level['mixingratios'] @ self.weights
 		elif self.dimension=='3d':
 			weighted_matrix=np.zeros((self.c.nlevel, self.c.ngangle, self.c.ntangle))
 			for g in range(self.c.ngangle):
 				for t in range(self.c.ntangle):
-					weighted_matrix[:,g,t] = self.level['mixingratios'][:,:,g,t] @ self.weights.values[0]
+					weighted_matrix[:,g,t] = self.level['mixingratios'][:,:,g,t] @ self.weights
 
 		#levels are the edges
 		self.level['mmw'] = weighted_matrix
@@ -398,68 +380,59 @@ class ATMSETUP():
 			cld_input = self.input['clouds']['profile'] 
 			
 			#then reshape and regrid inputs to be a nice matrix that is nlayer by nwave
+			weights = get_regrid_weights(self.input_wno, wno)
 			#total extinction optical depth 
 			opd = np.reshape(cld_input['opd'].values, (self.c.nlayer,self.c.input_npts_wave))
-			opd = regrid(opd, self.input_wno, wno)
+			opd = regrid(opd, self.input_wno, wno, weights=weights)
 			self.layer['cloud'] = {'opd': opd}
 			#cloud assymetry parameter
 			g0 = np.reshape(cld_input['g0'].values, (self.c.nlayer,self.c.input_npts_wave))
-			g0 = regrid(g0, self.input_wno, wno)
+			g0 = regrid(g0, self.input_wno, wno, weights=weights)
 			self.layer['cloud']['g0'] = g0
 			#cloud single scattering albedo 
 			w0 = np.reshape(cld_input['w0'].values, (self.c.nlayer,self.c.input_npts_wave))
-			w0 = regrid(w0, self.input_wno, wno)
+			w0 = regrid(w0, self.input_wno, wno, weights=weights)
 			self.layer['cloud']['w0'] = w0  
 
 		#if no filepath was given and nothing was given for g0/w0, then assume the run is cloud free and give zeros for all thi stuff		  
-		elif ((self.input['clouds']['profile'] == None) and (self.dimension=='1d')):
+		elif (isinstance(self.input['clouds']['profile'], type(None)) and (self.dimension=='1d')):
 
 			zeros = np.zeros((self.c.nlayer,self.c.output_npts_wave))
 			self.layer['cloud'] = {'w0': zeros}
 			self.layer['cloud']['g0'] = zeros
 			self.layer['cloud']['opd'] = zeros
 
+		#cloud free 3d run 
+		elif ((self.dimension=='3d') & isinstance(self.input_wno, type(None))):
+			zeros = np.zeros((self.c.nlayer,self.c.output_npts_wave,self.c.ngangle,self.c.ntangle))
+			self.layer['cloud'] = {'w0': zeros}
+			self.layer['cloud']['g0'] = zeros
+			self.layer['cloud']['opd'] = zeros
+
 		#ONLY OPTION FOR 3D INPUT
 		elif ((self.dimension=='3d') & (not isinstance(self.input_wno, type(None)))):
 			self.c.input_npts_wave = len(self.input_wno)
-			cld_input = h5py.File(self.input['clouds']['filepath'],'r',swmr=True)
-			opd = np.zeros((self.c.nlayer,self.c.output_npts_wave,self.c.ngangle,self.c.ntangle))
-			g0 = np.zeros((self.c.nlayer,self.c.output_npts_wave,self.c.ngangle,self.c.ntangle)) 
-			w0 = np.zeros((self.c.nlayer,self.c.output_npts_wave,self.c.ngangle,self.c.ntangle))
-			header = cld_input.attrs['header'].split(',')
+			cld_input, header, gangles, tangles = read_3d_input(self.input['clouds']['filepath'])
 
 			assert 'g0' in header, "Please make sure g0 is a named column in hdf5 cld file"
 			assert 'w0' in header, "Please make sure w0 is a named column in hdf5 cld file"
 			assert 'opd' in header, "Please make sure opd is a named column in hdf5 cld file"
 
-			iopd = np.where('opd' == np.array(header))[0][0]
-			ig0 = np.where('g0' == np.array(header))[0][0]
-			iw0 = np.where('w0' == np.array(header))[0][0]
-			#stick in clouds that are gangle and tangle dependent 
-			for g in range(self.c.ngangle):
-				for t in range(self.c.ntangle):
-
-					data = cld_input[self.gangles[g]][self.tangles[t]]
-
-					#make sure cloud input has the correct number of waves and PT points
-					assert data.shape[0] == self.c.nlayer*self.c.input_npts_wave, "Cloud input file is not on the same grid as the input PT/Angles profile:"
-
-					#Then, reshape and regrid inputs to be a nice matrix that is nlayer by nwave
-
-					#total extinction optical depth 
-					opd_lowres = np.reshape(data[:,iopd], (self.c.nlayer,self.c.input_npts_wave))
-					opd[:,:,g,t] = regrid(opd_lowres, self.input_wno, wno)
-					self.layer['cloud'] = {'opd': opd}
+			#make sure the clouds are on the same facets, PT points and waves as the PT profile 
+			if ((cld_input.shape[:3] != (self.c.ngangle, self.c.ntangle, self.c.nlayer*self.c.input_npts_wave)) 
+				or (not np.allclose(gangles, self.gangles)) or (not np.allclose(tangles, self.tangles))):
+				raise Exception("Cloud input file is not on the same grid as the input PT/Angles profile")
 
-					#cloud assymetry parameter
-					g0_lowres = np.reshape(data[:,ig0], (self.c.nlayer,self.c.input_npts_wave))
-					g0[:,:,g,t] = regrid(g0_lowres, self.input_wno, wno)
-					self.layer['cloud']['g0'] = g0
+			#(opd/g0/w0, nlayer, ng, nt, input nwave) so every facet is regridded at once 
+			cld_input = cld_input[:,:,:,[header.index('opd'), header.index('g0'), header.index('w0')]]
+			cld_input = np.reshape(cld_input, (self.c.ngangle, self.c.ntangle, self.c.nlayer, self.c.input_npts_wave, 3))
+			cld_input = np.transpose(cld_input, (4, 2, 0, 1, 3))
 
-					#cloud single scattering albedo 
-					w0_lowres = np.reshape(data[:,iw0], (self.c.nlayer,self.c.input_npts_wave))
-					w0[:,:,g,t] = regrid(w0_lowres, self.input_wno, wno)
-					self.layer['cloud']['w0'] = w0 			
+			#then fill in (nlayer, nwave, ng, nt) total extinction optical depth, 
+			#assymetry parameter and single scattering albedo 
+			cloud = np.zeros((3, self.c.nlayer, self.c.output_npts_wave, self.c.ngangle, self.c.ntangle))
+			cloud[:] = np.moveaxis(regrid(cld_input, self.input_wno, wno), -1, 2)
+			self.layer['cloud'] = {'opd': cloud[0], 'g0': cloud[1], 'w0': cloud[2]}
 
 		else:
 
@@ -476,6 +449,86 @@ class ATMSETUP():
 		return
 
 
+	def set_temperature(self, temperature):
+		"""
+		Changes the temperature profile of a 1d atmosphere that has already been set up. Density 
+		and the opacities of the layers whose temperature changed are refreshed in `update`. 
+
+		Parameters
+		----------
+		temperature : array 
+			Temperature of each level (K)
+		"""
+		temperature = np.asarray(temperature, dtype=float)
+		if np.shape(temperature) != np.shape(self.level['temperature']):
+			raise Exception("temperature must be given on the %i levels of the atmosphere" % self.c.nlevel)
+		layer = 0.5*(temperature[1:] + temperature[:-1])
+		changed = np.nonzero(layer != self.layer['temperature'])[0]
+
+		self.level['temperature'] = temperature
+		self.layer['temperature'] = layer
+		self.changed_layers = np.union1d(self.changed_layers, changed)
+		self.dirty |= {'density', 'opacities'}
+
+	def set_mixingratios(self, mixingratios):
+		"""
+		Changes the abundances of species that are already in a 1d atmosphere. Mean molecular 
+		weight is recomputed in `update`. Opacities are per molecule so they don't change. 
+
+		Parameters
+		----------
+		mixingratios : dict 
+			Mixing ratio (v/v) of each level for every species that changes e.g. {'H2O': array}
+		"""
+		for m, value in mixingratios.items():
+			if m not in self.species_index:
+				raise Exception("%s is not in the atmosphere, only the abundances of existing species can be set" % m)
+			self.level['mixingratios'][:, self.species_index[m]] = value
+		self.layer['mixingratios'] = 0.5*(self.level['mixingratios'][1:] + self.level['mixingratios'][:-1])
+		self.dirty |= {'mmw'}
+
+	def set_clouds(self, opd, g0, w0):
+		"""
+		Changes the clouds of a 1d atmosphere. Nothing else depends on them so no update is 
+		needed. 
+
+		Parameters
+		----------
+		opd : ndarray 
+			(nlayer, nwno) total extinction optical depth, on the wave grid of the opacities 
+		g0 : ndarray 
+			(nlayer, nwno) asymmetry parameter 
+		w0 : ndarray 
+			(nlayer, nwno) single scattering albedo 
+		"""
+		shape = np.shape(self.layer['cloud']['opd'])
+		if (np.shape(opd) != shape) or (np.shape(g0) != shape) or (np.shape(w0) != shape): 
+			raise Exception("opd, g0 and w0 must all be (nlayer, nwno) = (%i, %i)" % shape)
+		self.layer['cloud'] = {'opd': np.asarray(opd, dtype=float), 'g0': np.asarray(g0, dtype=float), 
+								'w0': np.asarray(w0, dtype=float)}
+
+	def update(self, opacityclass):
+		"""
+		Recomputes only what depends on the changes made through `set_temperature` and 
+		`set_mixingratios` since the last update, and has the opacity class refresh the 
+		opacities of the layers that changed. If the opacity class was last used for a 
+		different atmosphere, or this atmosphere was last updated with a different opacity 
+		class, all of the opacities are retrieved again. 
+
+		Parameters
+		----------
+		opacityclass : class picaso.RetrieveOpacities
+			Opacity class from `opannection`
+		"""
+		if 'mmw' in self.dirty:
+			self.get_mmw()
+		if 'density' in self.dirty:
+			self.get_density()
+		opacityclass.get_opacities(self, layers=self.changed_layers if 'opacities' in self.dirty else [])
+
+		self.dirty = set()
+		self.changed_layers = np.array([], dtype=int)
+
 	def get_surf_reflect(self,nwno):
 		"""
 		Gets the surface reflectivity from input
@@ -483,6 +536,55 @@ class ATMSETUP():
 		self.surf_reflect = np.zeros(nwno)
 		return
 
+	def get_unique_facets(self):
+		"""
+		Finds the facets of a 3d atmosphere that have identical columns (PT profile, chemistry 
+		and clouds). Each facet column is hashed and only the first facet with each hash is kept, 
+		so that opacities and optical properties are only computed once per unique column. 
+		Homogeneous or banded planets then cost about as much as a 1d run before the flux 
+		calculation. 
+
+		Sets `self.columns`, a shallow copy of the atmosphere with only the unique columns 
+		(stored as ncolumn x 1 facets) and `self.facet_index`, which is the (ng x nt) index of 
+		the column that belongs to each facet. 
+		"""
+		ng, nt = self.c.ngangle, self.c.ntangle
+		profile = [self.level[i] for i in ['temperature','pressure','mixingratios','electrons'] if i in self.level.keys()]
+		profile += [self.layer['cloud'][i] for i in ['opd','g0','w0']]
+
+		column_of = {}
+		facet_index = np.zeros(ng*nt, dtype=int)
+		for g in range(ng):
+			for t in range(nt):
+				key = hashlib.sha1()
+				for i in profile: 
+					key.update(np.ascontiguousarray(i[...,g,t]).tobytes())
+				facet_index[g*nt+t] = column_of.setdefault(key.digest(), len(column_of))
+		self.facet_index = facet_index.reshape((ng, nt))
+
+		#first facet of each column 
+		g, t = np.unravel_index(np.unique(facet_index, return_index=True)[1], (ng, nt))
+		self.columns = self.take_facets(g, t)
+
+	def take_facets(self, g, t):
+		"""
+		Returns a shallow copy of a 3d atmosphere with only some of the facets, stored as 
+		(nfacet x 1) facets. Only the level and layer arrays are copied. 
+
+		Parameters
+		----------
+		g : array of int 
+			Gauss angle index of each facet 
+		t : array of int 
+			Tchebyshev angle index of each facet 
+		"""
+		take = lambda x: x[...,g,t][...,np.newaxis]
+		atm = copy.copy(self)
+		atm.level = {i: take(self.level[i]) for i in self.level.keys()}
+		atm.layer = {i: take(self.layer[i]) for i in self.layer.keys() if i != 'cloud'}
+		atm.layer['cloud'] = {i: take(self.layer['cloud'][i]) for i in self.layer['cloud'].keys()}
+		return atm
+
 	def disect(self,g,t):
 		"""
 		This disects the 3d input to a 1d input which is a function of a single gangle and tangle. 
@@ -511,18 +613,39 @@ class ATMSETUP():
 		self.layer['cloud']['g0']= self.layer['cloud']['g0'][:,:,g,t]
 		self.layer['cloud']['w0'] = self.layer['cloud']['w0'][:,:,g,t]
 
+	def get_mixingratios_df(self, location='layer'):
+		"""
+		Mixing ratios as a dataframe with one column per species, e.g. for plotting. These 
+		are only built on request, everything else uses the (nlevel or nlayer, nspecies) 
+		arrays and `species_index`. 
+
+		Parameters
+		----------
+		location : str 
+			(Optional) Default = 'layer', or 'level' 
+
+		Returns
+		-------
+		pandas.DataFrame 
+			For 1d atmospheres, or the (n, nspecies, ng, nt) array for 3d
+		"""
+		mixingratios = getattr(self, location)['mixingratios']
+		if self.dimension == '3d':
+			return mixingratios
+		return pd.DataFrame(mixingratios, columns=list(self.species_index.keys()))
+
 	def as_dict(self):
 		"""
 		Get output into picklable dict format 
 		"""
 		df = {} 
-		df['weights'] = self.weights
+		df['weights'] = pd.DataFrame([self.weights], columns=list(self.species_index.keys()))
 		df['layer'] = {}
 		df['layer']['pressure_unit'] = 'bars'
 		df['layer']['mixingratio_unit'] = 'volume/volume'
 		df['layer']['temperature_unit'] = 'K'
 		df['layer']['pressure'] = self.layer['pressure']/ self.c.pconv #bars
-		df['layer']['mixingratios'] = self.layer['mixingratios']
+		df['layer']['mixingratios'] = self.get_mixingratios_df('layer')
 		df['layer']['temperature'] = self.layer['temperature']
 		df['wavenumber'] = self.wavenumber
 		df['wavenumber_unit'] = 'cm-1'
@@ -1,12 +1,11 @@
-import h5py
-from picaso import disco
+from picaso import disco, io_utils
 import pandas as pd
 import numpy as np
 
 
 
 
-def make_3d_pt_input(ng,nt,phase_angle,input_file,output_file,**kwargs):
+def make_3d_pt_input(ng,nt,phase_angle,input_file,output_file,quadrature='gauss_chebyshev',compression=None,**kwargs):
 	"""
 	Program to create 3d PT input. Used to feed GCM input into disco ball.
 
@@ -24,6 +23,12 @@ def make_3d_pt_input(ng,nt,phase_angle,input_file,output_file,**kwargs):
 		`pressure`, and at least some molecular species (which are ALL case-sensitive)
 	output_file : str
 		Output file location
+	quadrature : str 
+		(Optional) Disk integration scheme, must match the one given to `inputs.phase_angle` 
+		(see `disco.quadratures`)
+	compression : str 
+		(Optional) h5py compression filter for the output (e.g. 'gzip' or 'lzf'). Default = None, 
+		which is the fastest to write and read back
 
 	Returns
 	-------
@@ -49,24 +54,19 @@ def make_3d_pt_input(ng,nt,phase_angle,input_file,output_file,**kwargs):
 
 	"""
 
-	h5db = h5py.File(output_file,'w')
 	#get geometry
-	gangle,gweight,tangle,tweight = disco.get_angles(ng, nt)
-	ubar0, ubar1, cos_theta,lat,lon = disco.compute_disco(ng, nt, gangle, tangle, phase_angle)
+	geom = disco.get_geometry(ng, nt, phase_angle, quadrature)
+	gangle, tangle, lat, lon = geom.gangle, geom.tangle, geom.latitude, geom.longitude
 
+	#the same profile goes on every facet, so only read it once
+	data = pd.read_csv(input_file, delim_whitespace=True,**kwargs)
+	facets = np.broadcast_to(data.values.astype(float), (ng, nt)+data.shape)
 
+	io_utils.write_3d_input(output_file, facets, list(data.keys()), gangle, tangle, 
+		compression=compression)
 
-	first = True
-	for g in gangle:
-		for t in tangle:
-
-			data = pd.read_csv(input_file, delim_whitespace=True,**kwargs)
-			if first:
-				h5db.attrs['header'] = ','.join(list(data.keys()))
-				first = False
-			dset = h5db.create_dataset(str(g)+'/'+str(t), data=data, chunks=True)
-
-def make_3d_cld_input(ng,nt,phase_angle,input_file,output_file, lat_range=None, lon_range=None,rand_coverage=1):
+def make_3d_cld_input(ng,nt,phase_angle,input_file,output_file, lat_range=None, lon_range=None,rand_coverage=1,
+	quadrature='gauss_chebyshev', compression=None):
 	"""
 	Program to create 3d CLOUD input. Used to feed GCM input into disco ball.
 
@@ -91,6 +91,12 @@ def make_3d_cld_input(ng,nt,phase_angle,input_file,output_file, lat_range=None,
 	rand_coverage : float 
 		(Optional)Fractional cloud coverage. rand_cov=1 introduces full cloud coverage. rand_cov=0 has no
 		coverage. 
+	quadrature : str 
+		(Optional) Disk integration scheme, must match the one given to `inputs.phase_angle` 
+		(see `disco.quadratures`)
+	compression : str 
+		(Optional) h5py compression filter for the output (e.g. 'gzip' or 'lzf'). Default = None, 
+		which is the fastest to write and read back
 	**kwargs : dict 
 		Key word arguments used for `panads.read_csv`
 
@@ -112,29 +118,24 @@ def make_3d_cld_input(ng,nt,phase_angle,input_file,output_file, lat_range=None,
 	>>>         phase_angle, input_file,output_file)
 	"""
 
-	h5db = h5py.File(output_file,'w')
 	#get geometry
-	gangle,gweight,tangle,tweight = disco.get_angles(ng, nt)
-	ubar0, ubar1, cos_theta,lat,lon = disco.compute_disco(ng, nt, gangle, tangle, phase_angle)
-	first = True
-
-	for g, lg in zip(gangle,lon):
-		for t, lt in zip(tangle, lat):
-			data = pd.read_csv(input_file, delim_whitespace = True,
-					header=None, skiprows=1, names = ['lvl', 'wv','opd','g0','w0','sigma'],
-					dtype='f8')
-			if not isinstance(lat_range,type(None)):
-				if (lt > np.min(lat_range)) and (lt<np.max(lat_range)):
-					data = data*0
-			if not isinstance(lon_range,type(None)):
-				if (lg > np.min(lon_range)) and (lg < np.max(lon_range)):
-					data = data*0
-			if np.random.rand() > rand_coverage:
-				data = data*0
-
-
-			if first:
-				h5db.attrs['header'] = ','.join(list(data.keys()))
-				first = False
-			dset = h5db.create_dataset(str(g)+'/'+str(t), data=data, chunks=True)
+	geom = disco.get_geometry(ng, nt, phase_angle, quadrature)
+	gangle, tangle, lat, lon = geom.gangle, geom.tangle, geom.latitude, geom.longitude
+
+	data = pd.read_csv(input_file, delim_whitespace = True,
+			header=None, skiprows=1, names = ['lvl', 'wv','opd','g0','w0','sigma'],
+			dtype='f8')
+
+	#(ng, nt) mask of the facets that keep their clouds 
+	cloudy = np.ones((ng, nt), dtype=bool)
+	if not isinstance(lat_range,type(None)):
+		cloudy[:, (lat > np.min(lat_range)) & (lat < np.max(lat_range))] = False
+	if not isinstance(lon_range,type(None)):
+		cloudy[(lon > np.min(lon_range)) & (lon < np.max(lon_range)), :] = False
+	cloudy &= ~(np.random.rand(ng, nt) > rand_coverage)
+
+	facets = data.values[np.newaxis, np.newaxis, :, :] * cloudy[:, :, np.newaxis, np.newaxis]
+
+	io_utils.write_3d_input(output_file, facets, list(data.keys()), gangle, tangle, 
+		compression=compression)
 
@@ -1,6 +1,8 @@
 from numba import jit
-from numpy import pi, zeros, cos, arcsin, sin, arccos,outer,array,sum,zeros, linspace
+from numpy import pi, zeros, cos, arcsin, sin, arccos,outer,array,sum,zeros, linspace, allclose
 from numpy import polynomial
+from functools import lru_cache
+import warnings
 import json 
 import os 
 
@@ -69,8 +71,204 @@ def get_angles(num_gangle, num_tangle):
 	#a=json.load(open(os.path.join(refdata,'geometry.json')))
 	return gangle,gweight,tangle,tweight
 
+def get_angles_legendre(num_gangle, num_tangle, phase_angle):
+	"""Computes angles for disco ball with Gauss-Legendre quadrature in longitude and latitude. 
+
+	`get_angles` is Gauss-Legendre in the projected coordinate of the disk and Tchebychev 
+	in cos(latitude). The intensity has square root edges in both of those coordinates 
+	(at the terminator and limb) so the error only falls off as a power of the number of 
+	angles. In longitude and latitude the integrand is smooth, so the error falls off 
+	exponentially instead. For a Lambert sphere 6x6 angles are good to ~4e-5 at all phases 
+	(10x10 Gauss-Tchebychev is good to ~2e-5 - 5.4e-4, depending on phase) and 10x10 to 
+	~1e-11. For the cloudy Jupiter example, 6x6 is as good as 10x10 Gauss-Tchebychev near 
+	full phase and ~5x better at crescent phases, for about a third of the facets. 
+
+	The angles are returned in the same coordinates as `get_angles` so that `compute_disco` 
+	gives the matching ubar0 and ubar1. Unlike `get_angles`, the gauss angles depend on 
+	phase because they only cover the illuminated longitudes. 
+
+	Parameters
+	----------
+	num_gangles : int 
+		Number of Gauss angles in longitude 
+	num_tangles : int 
+		Number of Gauss angles in latitude
+	phase_angle : float 
+		Planetary phase angle (radians)
+
+	Returns
+	-------
+	np.ndarray, np.ndarray, np.ndarray, np.ndarray
+		Gauss Angles,Gauss Weights,Tchebyshev Angles,Tchebyshev weights
+	"""
+	cos_theta = cos(phase_angle)
+
+	#longitudes go from the terminator to the limb 
+	x, w = polynomial.legendre.leggauss(num_gangle)
+	lon_min, lon_max = phase_angle - pi/2, pi/2
+	longitude = lon_min + (lon_max - lon_min)*(x + 1)/2
+	#invert the longitude mapping in compute_disco, including its jacobian in the weights
+	gangle = (sin(longitude) + (cos_theta - 1)/2) * 2/(cos_theta + 1)
+	gweight = w * (lon_max - lon_min)/2 * cos(longitude) * 2/(cos_theta + 1)
+
+	#latitudes go from pole to pole, the sin**2 is the tchebychev weight and jacobian 
+	x, w = polynomial.legendre.leggauss(num_tangle)
+	latitude = pi/2*(x + 1)
+	tangle = cos(latitude)
+	tweight = w * pi/2 * sin(latitude)**2
+	return gangle,gweight,tangle,tweight
+
+#disk integration schemes that can be picked in `inputs.phase_angle`. Each one takes 
+#(num_gangle, num_tangle, phase_angle) and returns gangle, gweight, tangle, tweight in the 
+#coordinates that `compute_disco` maps to ubar0 and ubar1. New schemes can be added here.
+quadratures = {
+	'gauss_chebyshev': lambda num_gangle, num_tangle, phase_angle: get_angles(num_gangle, num_tangle),
+	'gauss_legendre': get_angles_legendre
+	}
+
+@lru_cache(maxsize=256)
+def get_geometry(ng, nt, phase_angle, quadrature='gauss_chebyshev'):
+	"""
+	Computes everything about the disco ball that only depends on the number of angles, the 
+	phase angle and the quadrature. Retrievals and grids reuse a handful of geometries many 
+	times, so this is memoized on the inputs and every call after the first is a lookup. 
+
+	Parameters
+	----------
+	ng : int 
+		Number of gauss angles 
+	nt : int 
+		Number of tchebyshev angles 
+	phase_angle : float 
+		Planetary phase angle (radians)
+	quadrature : str 
+		(Optional) Default = 'gauss_chebyshev', Disk integration scheme, any key of 
+		`quadratures` 
+
+	Returns
+	-------
+	geometry 
+		With attributes gangle, gweight, tangle, tweight, ubar0, ubar1, cos_theta, latitude, 
+		longitude, nt_unique (see `get_unique_tangles`) and weights, the (ng, nt) quadrature 
+		matrix gweight x tweight used by `compress_disco` and `compress_thermal`. The arrays are 
+		shared by every caller with the same inputs so they should not be modified in place. 
+	"""
+	geom = type('geometry', (object,),{})
+	geom.ng = ng 
+	geom.nt = nt 
+	geom.phase_angle = phase_angle
+	geom.quadrature = quadrature
+	if quadrature not in quadratures: 
+		raise Exception("quadrature must be one of: "+", ".join(quadratures.keys()))
+	geom.gangle,geom.gweight,geom.tangle,geom.tweight = quadratures[quadrature](ng, nt, phase_angle)
+	geom.ubar0, geom.ubar1, geom.cos_theta,geom.latitude,geom.longitude = compute_disco(ng, nt, 
+									geom.gangle, geom.tangle, phase_angle)
+	geom.weights = outer(geom.gweight, geom.tweight)
+	geom.nt_unique = get_unique_tangles(geom.ubar0, geom.ubar1)
+	return geom
+
+def adapt_angles(albedo, ng, nt, tolerance, max_angles=30):
+	"""
+	Picks the number of gauss and tchebyshev angles needed to get the albedo to within 
+	a tolerance. Starting from a coarse (ng, nt), each step estimates the error of the 
+	gauss and tchebyshev quadratures separately by refining one of them at a time, and 
+	only refines the ones that aren't converged. 
+
+	Parameters
+	----------
+	albedo : function 
+		albedo(ng, nt) returns the albedo spectrum for that disco ball 
+	ng : int 
+		Starting number of gauss angles 
+	nt : int 
+		Starting number of tchebyshev angles 
+	tolerance : float 
+		Maximum absolute albedo error (over all wavelengths) 
+	max_angles : int 
+		(Optional) Default = 30, Maximum number of gauss or tchebyshev angles. If the 
+		tolerance isn't reached before this a warning is raised. 
+
+	Returns
+	-------
+	int, int, ndarray
+		Number of gauss angles, number of tchebyshev angles and the albedo 
+	"""
+	spectra = {}
+	def get(ng, nt):
+		if (ng, nt) not in spectra: 
+			spectra[(ng, nt)] = albedo(ng, nt)
+		return spectra[(ng, nt)]
+
+	capped = False
+	while True: 
+		#refine by ~50% so each step costs about the same fraction of the answer
+		ng_fine = min(ng + max(2, ng//2), max_angles)
+		nt_fine = min(nt + max(2, nt//2), max_angles)
+		error_g = abs(get(ng_fine, nt) - get(ng, nt)).max() if ng_fine > ng else 0 
+		error_t = abs(get(ng, nt_fine) - get(ng, nt)).max() if nt_fine > nt else 0 
+
+		if (error_g < tolerance) & (error_t < tolerance): 
+			if capped:
+				warnings.warn("Reached max_angles=%i before the albedo tolerance was met" % max_angles, UserWarning)
+			return ng, nt, get(ng, nt)
+
+		if error_g >= tolerance: ng = ng_fine
+		if error_t >= tolerance: nt = nt_fine
+		#there is nothing left to compare against once a quadrature hits the max
+		capped = capped | (ng == max_angles) | (nt == max_angles)
+
+def get_unique_tangles(ubar0, ubar1):
+	"""
+	Checks if the disco ball is symmetric about the equator. The tchebyshev angles are 
+	symmetric about the equator, so for a horizontally homogeneous (1d) atmosphere the 
+	mirrored latitude columns of ubar0 and ubar1 (and therefore the intensities) are identical. 
+
+	Parameters
+	----------
+	ubar0 : ndarray of float 
+		the incident angles (ng by nt)
+	ubar1 : ndarray of float 
+		the outgoing angles (ng by nt)
+
+	Returns
+	-------
+	int 
+		Number of tchebyshev angles that need to be computed. If the geometry is 
+		not symmetric, this is just the total number of tchebyshev angles
+	"""
+	nt = ubar0.shape[1]
+	if (allclose(ubar0, ubar0[:,::-1], rtol=1e-12, atol=1e-14) and 
+		allclose(ubar1, ubar1[:,::-1], rtol=1e-12, atol=1e-14)):
+		return (nt+1)//2
+	else: 
+		return nt
+
+def mirror_disco(half, nt):
+	"""
+	Mirrors intensities that were only computed for the unique tchebyshev angles 
+	(see `get_unique_tangles`) back onto the full disco ball. 
+
+	Parameters
+	----------
+	half : ndarray of floats 
+		Intensity at the top of the atmosphere with dimensions (ng, nt_unique, nwno)
+	nt : int 
+		Total number of tchebyshev angles 
+
+	Returns
+	-------
+	ndarray 
+		Intensity at the top of the atmosphere with dimensions (ng, nt, nwno)
+	"""
+	nt_unique = half.shape[1]
+	if nt_unique == nt: return half
+	full = zeros((half.shape[0], nt, half.shape[2]))
+	full[:,:nt_unique,:] = half
+	full[:,nt_unique:,:] = half[:,:nt-nt_unique,:][:,::-1,:]
+	return full
+
 @jit(nopython=True, cache=True)
-def compress_disco( nwno, cos_theta, xint_at_top, gweight, tweight,F0PI): 
+def compress_disco( nwno, cos_theta, xint_at_top, weights,F0PI): 
 	"""
 	Last step in albedo code. Integrates over phase angle based on the 
 	Gaussian-Chebychev weights in geometry.json 
@@ -83,21 +281,22 @@ def compress_disco( nwno, cos_theta, xint_at_top, gweight, tweight,F0PI):
 		Cosine of phase angle 
 	xint_at_top : ndarray of floats 
 		Planetary intensity at the top of the atmosphere with dimensions (ng, nt, nwno)
-	gweight : ndarray of floats 
-		Gaussian weights for integration 
-	tweight : ndarray of floats 
-		Chebychev weights for integration
+	weights : ndarray of floats 
+		Quadrature weights for integration, outer(gweight, tweight) with dimensions (ng, nt) 
+		(see `get_geometry`)
 	F0PI : ndarray of floats 
 		Stellar flux 
 	"""
 	albedo=zeros(nwno)
-	for w in range(nwno):
-		albedo[w] = sum((xint_at_top[:,:,w]*tweight).T*gweight)
+	#single contraction over the facets, each one adds a contiguous spectrum
+	for g in range(weights.shape[0]):
+		for t in range(weights.shape[1]):
+			albedo += weights[g,t]*xint_at_top[g,t,:]
 	albedo = 0.5 * albedo /F0PI * (cos_theta + 1.0)
 	return albedo
 
 @jit(nopython=True, cache=True)
-def compress_thermal(nwno, ubar1, flux_at_top, gweight, tweight): 
+def compress_thermal(nwno, ubar1, flux_at_top, weights): 
 	"""
 	Last step in albedo code. Integrates over phase angle based on the 
 	Gaussian-Chebychev weights in geometry.json 
@@ -110,12 +309,12 @@ def compress_thermal(nwno, ubar1, flux_at_top, gweight, tweight):
 		Outgoing angles 
 	flux_at_top : ndarray of floats 
 		Thermal Flux at the top of the atmosphere with dimensions (ng, nt, nwno)
-	gweight : ndarray of floats 
-		Gaussian weights for integration 
-	tweight : ndarray of floats 
-		Chebychev weights for integration
+	weights : ndarray of floats 
+		Quadrature weights for integration, outer(gweight, tweight) with dimensions (ng, nt) 
+		(see `get_geometry`)
 	"""
 	flux=zeros(nwno)
-	for w in range(nwno):
-		flux[w] = 0.5 * sum((ubar1*flux_at_top[:,:,w]*tweight).T*gweight)
+	for g in range(weights.shape[0]):
+		for t in range(weights.shape[1]):
+			flux += (0.5*ubar1[g,t]*weights[g,t])*flux_at_top[g,t,:]
 	return flux
@@ -1,4 +1,4 @@
-from numba import jit, vectorize
+from numba import jit, vectorize, prange
 from numpy import exp, zeros, where, sqrt, cumsum , pi, outer
 
 @jit(nopython=True, cache=True)
@@ -125,18 +125,13 @@ def get_flux_toon(nlevel, wno, nwno, tau, dtau, w0, cosbar, surf_reflect, ubar0,
 									g1, g2, g3, lamda, gama, dtau, 
 									exptrm_positive,  exptrm_minus) 
 
-	positive = zeros((nlayer, nwno))
-	negative = zeros((nlayer, nwno))
-	#========================= Start loop over wavelength =========================
 	L = 2*nlayer
-	for w in range(nwno):
-		#coefficient of posive and negative exponential terms 
-		X = tri_diag_solve(L, A[:,w], B[:,w], C[:,w], D[:,w])
+	#coefficient of posive and negative exponential terms, for all wavelengths 
+	X = tri_diag_solve_wno(L, A, B, C, D)
 
-		#unmix the coefficients
-		positive[:,w] = X[::2] + X[1::2] 
-		negative[:,w] = X[::2] - X[1::2]
-	#========================= End loop over wavelength =========================
+	#unmix the coefficients
+	positive = X[::2,:] + X[1::2,:] 
+	negative = X[::2,:] - X[1::2,:]
 
 	#might have to add this in to avoid numerical problems later. 
 	#if len(np.where(negative[:,w]/X[::2] < 1e-30)) >0 , print(negative[:,w],X[::2],negative[:,w]/X[::2])
@@ -219,6 +214,55 @@ def numba_cumsum(mat):
 		new_mat[:,i] = cumsum(mat[:,i])
 	return new_mat
 
+@jit(nopython=True, cache=True)
+def get_truncation_layer(dtau, tau, w0, cosb, tau_max):
+	"""
+	Finds how many layers from the top are needed for the reflected light calculation. Below 
+	that, both the direct beam (cumulative tau) and the diffuse field (cumulative lamda*dtau, 
+	the same exponential that `slice_gt` clamps per layer) have been attenuated by more than 
+	exp(-tau_max) at every wavelength so those layers can't change the intensity at the top. 
+
+	Parameters
+	----------
+	dtau : ndarray of float 
+		Opacity per layer, Dimensions=# layer by # wave
+	tau : ndarray of float 
+		Cumulative opacity, Dimensions=# level by # wave
+	w0 : ndarray of float 
+		Single scattering albedo, Dimensions=# layer by # wave
+	cosb : ndarray of float 
+		Asymmetry factor, Dimensions=# layer by # wave
+	tau_max : float 
+		Optical depth past which a layer is considered invisible (e.g. 35)
+
+	Returns
+	-------
+	int 
+		Number of layers to keep, between 1 and # layer 
+	"""
+	nlayer = dtau.shape[0]
+	nwno = dtau.shape[1]
+
+	#toon 1989 table 1 for the quadrature closure used in get_reflected_1d
+	sq3 = sqrt(3.)
+	g1	= (sq3*0.5)*(2. - w0*(1.+cosb))
+	g2	= (sq3*w0*0.5)*(1.-cosb)
+	lamda = sqrt(g1**2 - g2**2)
+
+	nlayer_keep = 1
+	for w in range(nwno):
+		diffuse = 0.0
+		for i in range(nlayer):
+			#both only increase with depth, so nothing below this layer is needed either
+			if (tau[i,w] > tau_max) and (diffuse > tau_max):
+				break
+			diffuse += lamda[i,w]*dtau[i,w]
+			if i+1 > nlayer_keep: 
+				nlayer_keep = i+1
+		if nlayer_keep == nlayer:
+			break
+	return nlayer_keep
+
 @jit(nopython=True, cache=True)
 def setup_tri_diag(nlayer,nwno ,c_plus_up, c_minus_up, 
 	c_plus_down, c_minus_down, b_top, b_surface, surf_reflect,
@@ -361,6 +405,53 @@ def tri_diag_solve(l, a, b, c, d):
 
 
 @jit(nopython=True, cache=True)
+def tri_diag_solve_wno(l, a, b, c, d):
+	"""
+	Same Tridiagonal Matrix Algorithm as `tri_diag_solve` but for every wavelength at once. 
+	The coefficients are (l, nwno) arrays as they come out of `setup_tri_diag`, and the 
+	sweeps go row by row so that the inner loop over wavelength reads contiguous memory. 
+
+	.. math:: A(I)*X(I-1) + B(I)*X(I) + C(I)*X(I+1) = D(I)
+
+	Parameters
+	----------
+	l : int 
+		Number of rows in the system (2 x # layers)
+	a : ndarray 
+		Dimensions=l by # wave 
+	b : ndarray 
+		Dimensions=l by # wave 
+	c : ndarray 
+		Dimensions=l by # wave 
+	d : ndarray 
+		Dimensions=l by # wave 
+
+	Returns
+	-------
+	ndarray 
+		Solution, x, with dimensions l by # wave 
+	"""
+	nwno = a.shape[1]
+	AS, DS, XK = zeros((l,nwno)), zeros((l,nwno)), zeros((l,nwno))
+
+	for w in range(nwno):
+		AS[-1,w] = a[-1,w]/b[-1,w]
+		DS[-1,w] = d[-1,w]/b[-1,w]
+
+	for i in range(l-2, -1, -1):
+		for w in range(nwno):
+			x = 1.0 / (b[i,w] - c[i,w] * AS[i+1,w])
+			AS[i,w] = a[i,w] * x
+			DS[i,w] = (d[i,w]-c[i,w] * DS[i+1,w]) * x
+
+	for w in range(nwno):
+		XK[0,w] = DS[0,w]
+	for i in range(1,l):
+		for w in range(nwno):
+			XK[i,w] = DS[i,w] - AS[i,w] * XK[i-1,w]
+	return XK
+
+@jit(nopython=True, cache=True, parallel=True)
 def get_reflected_3d(nlevel, wno,nwno, numg,numt, dtau_3d, tau_3d, w0_3d, cosb_3d,gcos2_3d, ftau_cld_3d,ftau_ray_3d,
 	dtau_og_3d, tau_og_3d, w0_og_3d, cosb_og_3d, 
 	surf_reflect,ubar0, ubar1,cos_theta, F0PI,single_phase, multi_phase,
@@ -370,6 +461,10 @@ def get_reflected_3d(nlevel, wno,nwno, numg,numt, dtau_3d, tau_3d, w0_3d, cosb_3
 	as `get_flux_geom_1d` but is kept separately so we don't have to do unecessary indexing for 
 	retrievals. 
 
+	All the 3d inputs are facet-major (numg, numt, nlayer or nlevel, nwno) so that each 
+	facet is a contiguous block. Facets are independent of each other so they are 
+	computed in parallel, each one writing its own `xint_at_top[ng,nt,:]`.
+
 	Parameters
 	----------
 	nlevel : int 
@@ -385,19 +480,19 @@ def get_reflected_3d(nlevel, wno,nwno, numg,numt, dtau_3d, tau_3d, w0_3d, cosb_3
 	dtau_3d : ndarray of float
 		This is the opacity contained within each individual layer (defined at midpoints of "levels")
 		WITHOUT D-Eddington Correction
-		Dimensions=# layer by # wave
+		Dimensions=# gauss angles by # tchebyshev angles by # layer by # wave
 	tau_3d : ndarray of float
 		This is the cumulative summed opacity 
 		WITHOUT D-Eddington Correction
-		Dimensions=# level by # wave		
+		Dimensions=# gauss angles by # tchebyshev angles by # level by # wave		
 	w0_3d : ndarray of float 
 		This is the single scattering albedo, from scattering, clouds, raman, etc 
 		WITHOUT D-Eddington Correction
-		Dimensions=# layer by # wave
+		Dimensions=# gauss angles by # tchebyshev angles by # layer by # wave
 	cosb_3d : ndarray of float 
 		This is the asymmetry factor 
 		WITHOUT D-Eddington Correction
-		Dimensions=# layer by # wave
+		Dimensions=# gauss angles by # tchebyshev angles by # layer by # wave
 	gcos2_3d : ndarray of float 
 		Parameter that allows us to directly include Rayleigh scattering 
 		= 0.5*tau_rayleigh/(tau_rayleigh + tau_cloud)
@@ -410,11 +505,11 @@ def get_reflected_3d(nlevel, wno,nwno, numg,numt, dtau_3d, tau_3d, w0_3d, cosb_3
 	dtau_og_3d : ndarray of float 
 		This is the opacity contained within each individual layer (defined at midpoints of "levels")
 		WITHOUT the delta eddington correction, if it was specified by user
-		Dimensions=# layer by # wave
+		Dimensions=# gauss angles by # tchebyshev angles by # layer by # wave
 	tau_og_3d : ndarray of float
 		This is the cumulative summed opacity 
 		WITHOUT the delta eddington correction, if it was specified by user
-		Dimensions=# level by # wave	
+		Dimensions=# gauss angles by # tchebyshev angles by # level by # wave	
 	w0_og_3d : ndarray of float 
 		Same as w0 but WITHOUT the delta eddington correction, if it was specified by user	
 	cosb_og_3d : ndarray of float 
@@ -463,195 +558,219 @@ def get_reflected_3d(nlevel, wno,nwno, numg,numt, dtau_3d, tau_3d, w0_3d, cosb_3
 
 	xint_at_top = zeros((numg, numt, nwno))
 
+	#================ START CRAZE LOOP OVER ANGLE #================
+	#flatten the facets so that they can all be farmed out in parallel
+	for ig in prange(numg*numt):
+		ng = ig // numt
+		nt = ig % numt
+
+		#get needed chunk for 3d inputs
+		#facet-major so each of these is a contiguous (nlayer, nwno) block
+		#uncorrected original values (*_og) are used because HG single scattering 
+		#phase function does get the forward and back scattering pretty accurately 
+		#so delta-eddington is only applied to the multiple scattering terms
+		xint_at_top[ng,nt,:] = get_reflected_facet(nlevel, nwno, 
+									dtau_3d[ng,nt], tau_3d[ng,nt], w0_3d[ng,nt], cosb_3d[ng,nt], 
+									gcos2_3d[ng,nt], ftau_cld_3d[ng,nt], ftau_ray_3d[ng,nt],
+									dtau_og_3d[ng,nt], tau_og_3d[ng,nt], w0_og_3d[ng,nt], cosb_og_3d[ng,nt], 
+									surf_reflect, ubar0[ng,nt], ubar1[ng,nt], cos_theta, F0PI, 
+									single_phase, multi_phase,
+									frac_a, frac_b, frac_c, constant_back, constant_forward)
+	return xint_at_top
+
+@jit(nopython=True, cache=True)
+def get_reflected_facet(nlevel, nwno, dtau, tau, w0, cosb, gcos2, ftau_cld, ftau_ray,
+	dtau_og, tau_og, w0_og, cosb_og, 
+	surf_reflect, ubar0, ubar1, cos_theta, F0PI, single_phase, multi_phase,
+	frac_a, frac_b, frac_c, constant_back, constant_forward):
+	"""
+	Computes the toon intensity at the top of the atmosphere for a single facet of the 
+	disco ball. This is the per-facet work of `get_reflected_3d`, where every facet has 
+	its own column of optical properties. 
+
+	Parameters
+	----------
+	nlevel : int 
+		Number of levels in the model 
+	nwno : int 
+		Number of wave points
+	dtau, tau, w0, cosb, gcos2, ftau_cld, ftau_ray : ndarray of float 
+		Optical properties of this facet (see `get_reflected_3d`). Dimensions=# layer (or level) by # wave
+	dtau_og, tau_og, w0_og, cosb_og : ndarray of float 
+		Same as above but WITHOUT the delta eddington correction, if it was specified by user 
+	surf_reflect : float 
+		Surface reflectivity 
+	ubar0 : float 
+		Cosine of the incident angle of this facet 
+	ubar1 : float 
+		Cosine of the observer angle of this facet 
+	cos_theta : float 
+		Cosine of the phase angle of the planet 
+	F0PI : array 
+		Downward incident solar radiation
+	single_phase, multi_phase, frac_a, frac_b, frac_c, constant_back, constant_forward : 
+		Phase function options (see `get_reflected_3d`)
+
+	Returns
+	-------
+	intensity at the top of the atmosphere for this facet (nwno)
+	"""
 	nlayer = nlevel - 1 
 
 	#now define terms of Toon et al 1989 quadrature Table 1 
 	#https://agupubs.onlinelibrary.wiley.com/doi/pdf/10.1029/JD094iD13p16287
 	#see table of terms 
-
-	#terms not dependent on incident angle
 	sq3 = sqrt(3.)
 
-	#================ START CRAZE LOOP OVER ANGLE #================
-	for ng in range(numg):
-		for nt in range(numt):
+	g1	= (sq3*0.5)*(2. - w0*(1.+cosb))	#table 1
+	g2	= (sq3*w0*0.5)*(1.-cosb)		   #table 1
+	lamda = sqrt(g1**2 - g2**2)			  #eqn 21
+	gama  = (g1-lamda)/g2					#eqn 22
+	g3	= 0.5*(1.-sq3*cosb*ubar0)   #table 1
 
-			#get needed chunk for 3d inputs
-			#should consider thinking of a better method for when doing 1d only
-			cosb = cosb_3d[:,:,ng,nt]
-			dtau = dtau_3d[:,:,ng,nt]
-			tau = tau_3d[:,:,ng,nt]
-			w0 = w0_3d[:,:,ng,nt]
-			gcos2 = gcos2_3d[:,:,ng,nt]
-			ftau_cld = ftau_cld_3d[:,:,ng,nt]
-			ftau_ray = ftau_ray_3d[:,:,ng,nt]
-
-			#uncorrected original values (in case user specified D-Eddington)
-			#If they did not, this is the same thing as what is defined above 
-			#These are used because HG single scattering phase function does get 
-			#the forward and back scattering pretty accurately so delta-eddington
-			#is only applied to the multiple scattering terms
-			cosb_og = cosb_og_3d[:,:,ng,nt]
-			dtau_og = dtau_og_3d[:,:,ng,nt]
-			tau_og = tau_og_3d[:,:,ng,nt]
-			w0_og = w0_og_3d[:,:,ng,nt]			
-
-			g1	= (sq3*0.5)*(2. - w0*(1.+cosb))	#table 1
-			g2	= (sq3*w0*0.5)*(1.-cosb)		   #table 1
-			lamda = sqrt(g1**2 - g2**2)			  #eqn 21
-			gama  = (g1-lamda)/g2					#eqn 22
-			g3	= 0.5*(1.-sq3*cosb*ubar0[ng, nt])   #table 1 #ubar is now 100x 10 matrix.. 
-	
-			# now calculate c_plus and c_minus (equation 23 and 24)
-			g4 = 1.0 - g3
-			denominator = lamda**2 - 1.0/ubar0[ng, nt]**2.0
-
-			#everything but the exponential 
-			a_minus = F0PI*w0* (g4*(g1 + 1.0/ubar0[ng, nt]) +g2*g3 ) / denominator
-			a_plus  = F0PI*w0*(g3*(g1-1.0/ubar0[ng, nt]) +g2*g4) / denominator
-
-			#add in exponential to get full eqn
-			#_up is the terms evaluated at lower optical depths (higher altitudes)
-			#_down is terms evaluated at higher optical depths (lower altitudes)
-			x = exp(-tau[:-1,:]/ubar0[ng, nt])
-			c_minus_up = a_minus*x #CMM1
-			c_plus_up  = a_plus*x #CPM1
-			x = exp(-tau[1:,:]/ubar0[ng, nt])
-			c_minus_down = a_minus*x #CM
-			c_plus_down  = a_plus*x #CP
-
-			#calculate exponential terms needed for the tridiagonal rotated layered method
-			exptrm = lamda*dtau
-			#save from overflow 
-			exptrm = slice_gt (exptrm, 40.0) 
-
-			exptrm_positive = exp(exptrm) #EP
-			exptrm_minus = 1.0/exptrm_positive#exp(-exptrm) #EM
-
-
-			#boundary conditions 
-			b_top = 0.0										  
-			b_surface = 0. + surf_reflect*ubar0[ng, nt]*F0PI*exp(-tau[-1, :]/ubar0[ng, nt])
-
-			#Now we need the terms for the tridiagonal rotated layered method
-			A, B, C, D = setup_tri_diag(nlayer,nwno,  c_plus_up, c_minus_up, 
-									c_plus_down, c_minus_down, b_top, b_surface, surf_reflect,
-									 gama, dtau, 
-									exptrm_positive,  exptrm_minus) 
+	# now calculate c_plus and c_minus (equation 23 and 24)
+	g4 = 1.0 - g3
+	denominator = lamda**2 - 1.0/ubar0**2.0
 
-			positive = zeros((nlayer, nwno))
-			negative = zeros((nlayer, nwno))
-			#========================= Start loop over wavelength =========================
-			L = 2*nlayer
-			for w in range(nwno):
-				#coefficient of posive and negative exponential terms 
-				X = tri_diag_solve(L, A[:,w], B[:,w], C[:,w], D[:,w])
-
-				#unmix the coefficients
-				positive[:,w] = X[::2] + X[1::2] 
-				negative[:,w] = X[::2] - X[1::2]
-			#========================= End loop over wavelength =========================
-
-			#use expression for bottom flux to get the flux_plus and flux_minus at last
-			#bottom layer
-			flux_zero  = positive[-1,:]*exptrm_positive[-1,:] + gama[-1,:]*negative[-1,:]*exptrm_minus[-1,:] + c_plus_down[-1,:]
-			
-			xint = zeros((nlevel,nwno))
-			xint[-1,:] = flux_zero/pi
-
-			################################ BEGIN OPTIONS FOR MULTIPLE SCATTERING####################
-
-			#Legendre polynomials for the Phase function due to multiple scatterers 
-			if multi_phase ==0:#'N=2':
-				#ubar2 is defined to deal with the integration over the second moment of the 
-				#intensity. It is FIT TO PURE RAYLEIGH LIMIT, ~(1/sqrt(3))^(1/2)
-				#this is a decent assumption because our second order legendre polynomial 
-				#is forced to be equal to the rayleigh phase function
-				ubar2 = 0.767  # 
-				multi_plus = (1.0+1.5*cosb*ubar1[ng,nt] #!was 3
-								+ gcos2*(3.0*ubar2*ubar2*ubar1[ng,nt]*ubar1[ng,nt] - 1.0)/2.0)
-				multi_minus = (1.-1.5*cosb*ubar1[ng,nt] 
-								+ gcos2*(3.0*ubar2*ubar2*ubar1[ng,nt]*ubar1[ng,nt] - 1.0)/2.0)
-			elif multi_phase ==1:#'N=1':
-				multi_plus = 1.0+1.5*cosb*ubar1[ng,nt]	
-				multi_minus = 1.-1.5*cosb*ubar1[ng,nt]
-			################################ END OPTIONS FOR MULTIPLE SCATTERING####################
-
-
-			G=w0*positive*(multi_plus+gama*multi_minus)
-			H=w0*negative*(gama*multi_plus+multi_minus)
-			A=w0*(multi_plus*c_plus_up+multi_minus*c_minus_up)
-
-			G=G*0.5/pi
-			H=H*0.5/pi
-			A=A*0.5/pi
-
-			################################ BEGIN OPTIONS FOR DIRECT SCATTERING####################
-			#define f (fraction of forward to back scattering), 
-			#g_forward (forward asymmetry), g_back (backward asym)
-			#needed for everything except the OTHG
-			if single_phase!=1: 
-				g_forward = constant_forward*cosb_og
-				g_back = -constant_back*cosb_og
-				f = frac_a + frac_b*g_back**frac_c
-
-
-			if single_phase==0:#'cahoy':
-				#Phase function for single scattering albedo frum Solar beam
-				#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
-					  #first term of TTHG: forward scattering
-				p_single=(f * (1-g_forward**2)
-								/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-								#second term of TTHG: backward scattering
-								+(1-f)*(1-g_back**2)
-								/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3)+
-								#rayleigh phase function
-								(gcos2))
-			elif single_phase==1:#'OTHG':
-				p_single=(1-cosb_og**2)/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-			elif single_phase==2:#'TTHG':
-				#Phase function for single scattering albedo frum Solar beam
-				#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
-					  #first term of TTHG: forward scattering
-				p_single=(f * (1-g_forward**2)
-								/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-								#second term of TTHG: backward scattering
-								+(1-f)*(1-g_back**2)
-								/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))
-			elif single_phase==3:#'TTHG_ray':
-				#Phase function for single scattering albedo frum Solar beam
-				#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
-					  		#first term of TTHG: forward scattering
-				p_single=(ftau_cld*(f * (1-g_forward**2)
-												/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-												#second term of TTHG: backward scattering
-												+(1-f)*(1-g_back**2)
-												/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))+			
-								#rayleigh phase function
-								ftau_ray*(0.75*(1+cos_theta**2.0)))
-
-			################################ END OPTIONS FOR DIRECT SCATTERING####################
-
-			for i in range(nlayer-1,-1,-1):
-				#direct beam
-				#note when delta-eddington=off, then tau_single=tau, cosb_single=cosb, w0_single=w0, etc
-				xint[i,:] =( xint[i+1,:]*exp(-dtau[i,:]/ubar1[ng,nt])
-						#single scattering albedo from sun beam (from ubar0 to ubar1)
-						+(w0_og[i,:]*F0PI/(4.*pi))*
-						(p_single[i,:])*exp(-tau_og[i,:]/ubar0[ng,nt])*
-						(1. - exp(-dtau_og[i,:]*(ubar0[ng,nt]+ubar1[ng,nt])/(ubar0[ng,nt]*ubar1[ng,nt])))*
-						(ubar0[ng,nt]/(ubar0[ng,nt]+ubar1[ng,nt]))
-						#three multiple scattering terms 
-						+A[i,:]* (1. - exp(-dtau[i,:] *(ubar0[ng,nt]+1*ubar1[ng,nt])/(ubar0[ng,nt]*ubar1[ng,nt])))*
-						(ubar0[ng,nt]/(ubar0[ng,nt]+1*ubar1[ng,nt]))
-						+G[i,:]*(exp(exptrm[i,:]*1-dtau[i,:]/ubar1[ng,nt]) - 1.0)/(lamda[i,:]*1*ubar1[ng,nt] - 1.0)
-						+H[i,:]*(1. - exp(-exptrm[i,:]*1-dtau[i,:]/ubar1[ng,nt]))/(lamda[i,:]*1*ubar1[ng,nt] + 1.0))
-						#thermal
-
-			xint_at_top[ng,nt,:] = xint[0,:]	
-	return xint_at_top
+	#everything but the exponential 
+	a_minus = F0PI*w0* (g4*(g1 + 1.0/ubar0) +g2*g3 ) / denominator
+	a_plus  = F0PI*w0*(g3*(g1-1.0/ubar0) +g2*g4) / denominator
 
-@jit(nopython=True, cache=True)
+	#add in exponential to get full eqn
+	#_up is the terms evaluated at lower optical depths (higher altitudes)
+	#_down is terms evaluated at higher optical depths (lower altitudes)
+	x = exp(-tau[:-1,:]/ubar0)
+	c_minus_up = a_minus*x #CMM1
+	c_plus_up  = a_plus*x #CPM1
+	x = exp(-tau[1:,:]/ubar0)
+	c_minus_down = a_minus*x #CM
+	c_plus_down  = a_plus*x #CP
+
+	#calculate exponential terms needed for the tridiagonal rotated layered method
+	exptrm = lamda*dtau
+	#save from overflow 
+	exptrm = slice_gt (exptrm, 40.0) 
+
+	exptrm_positive = exp(exptrm) #EP
+	exptrm_minus = 1.0/exptrm_positive#exp(-exptrm) #EM
+
+
+	#boundary conditions 
+	b_top = 0.0										  
+	b_surface = 0. + surf_reflect*ubar0*F0PI*exp(-tau[-1, :]/ubar0)
+
+	#Now we need the terms for the tridiagonal rotated layered method
+	A, B, C, D = setup_tri_diag(nlayer,nwno,  c_plus_up, c_minus_up, 
+							c_plus_down, c_minus_down, b_top, b_surface, surf_reflect,
+							 gama, dtau, 
+							exptrm_positive,  exptrm_minus) 
+
+	L = 2*nlayer
+	#coefficient of posive and negative exponential terms, for all wavelengths 
+	X = tri_diag_solve_wno(L, A, B, C, D)
+
+	#unmix the coefficients
+	positive = X[::2,:] + X[1::2,:] 
+	negative = X[::2,:] - X[1::2,:]
+
+	#use expression for bottom flux to get the flux_plus and flux_minus at last
+	#bottom layer
+	flux_zero  = positive[-1,:]*exptrm_positive[-1,:] + gama[-1,:]*negative[-1,:]*exptrm_minus[-1,:] + c_plus_down[-1,:]
+	
+	xint = zeros((nlevel,nwno))
+	xint[-1,:] = flux_zero/pi
+
+	################################ BEGIN OPTIONS FOR MULTIPLE SCATTERING####################
+
+	#Legendre polynomials for the Phase function due to multiple scatterers 
+	if multi_phase ==0:#'N=2':
+		#ubar2 is defined to deal with the integration over the second moment of the 
+		#intensity. It is FIT TO PURE RAYLEIGH LIMIT, ~(1/sqrt(3))^(1/2)
+		#this is a decent assumption because our second order legendre polynomial 
+		#is forced to be equal to the rayleigh phase function
+		ubar2 = 0.767  # 
+		multi_plus = (1.0+1.5*cosb*ubar1 #!was 3
+						+ gcos2*(3.0*ubar2*ubar2*ubar1*ubar1 - 1.0)/2.0)
+		multi_minus = (1.-1.5*cosb*ubar1 
+						+ gcos2*(3.0*ubar2*ubar2*ubar1*ubar1 - 1.0)/2.0)
+	elif multi_phase ==1:#'N=1':
+		multi_plus = 1.0+1.5*cosb*ubar1	
+		multi_minus = 1.-1.5*cosb*ubar1
+	################################ END OPTIONS FOR MULTIPLE SCATTERING####################
+
+
+	G=w0*positive*(multi_plus+gama*multi_minus)
+	H=w0*negative*(gama*multi_plus+multi_minus)
+	A=w0*(multi_plus*c_plus_up+multi_minus*c_minus_up)
+
+	G=G*0.5/pi
+	H=H*0.5/pi
+	A=A*0.5/pi
+
+	################################ BEGIN OPTIONS FOR DIRECT SCATTERING####################
+	#define f (fraction of forward to back scattering), 
+	#g_forward (forward asymmetry), g_back (backward asym)
+	#needed for everything except the OTHG
+	if single_phase!=1: 
+		g_forward = constant_forward*cosb_og
+		g_back = -constant_back*cosb_og
+		f = frac_a + frac_b*g_back**frac_c
+
+
+	if single_phase==0:#'cahoy':
+		#Phase function for single scattering albedo frum Solar beam
+		#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
+			  #first term of TTHG: forward scattering
+		p_single=(f * (1-g_forward**2)
+						/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+						#second term of TTHG: backward scattering
+						+(1-f)*(1-g_back**2)
+						/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3)+
+						#rayleigh phase function
+						(gcos2))
+	elif single_phase==1:#'OTHG':
+		p_single=(1-cosb_og**2)/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+	elif single_phase==2:#'TTHG':
+		#Phase function for single scattering albedo frum Solar beam
+		#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
+			  #first term of TTHG: forward scattering
+		p_single=(f * (1-g_forward**2)
+						/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+						#second term of TTHG: backward scattering
+						+(1-f)*(1-g_back**2)
+						/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))
+	elif single_phase==3:#'TTHG_ray':
+		#Phase function for single scattering albedo frum Solar beam
+		#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
+			  		#first term of TTHG: forward scattering
+		p_single=(ftau_cld*(f * (1-g_forward**2)
+										/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+										#second term of TTHG: backward scattering
+										+(1-f)*(1-g_back**2)
+										/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))+			
+						#rayleigh phase function
+						ftau_ray*(0.75*(1+cos_theta**2.0)))
+
+	################################ END OPTIONS FOR DIRECT SCATTERING####################
+
+	for i in range(nlayer-1,-1,-1):
+		#direct beam
+		#note when delta-eddington=off, then tau_single=tau, cosb_single=cosb, w0_single=w0, etc
+		xint[i,:] =( xint[i+1,:]*exp(-dtau[i,:]/ubar1)
+				#single scattering albedo from sun beam (from ubar0 to ubar1)
+				+(w0_og[i,:]*F0PI/(4.*pi))*
+				(p_single[i,:])*exp(-tau_og[i,:]/ubar0)*
+				(1. - exp(-dtau_og[i,:]*(ubar0+ubar1)/(ubar0*ubar1)))*
+				(ubar0/(ubar0+ubar1))
+				#three multiple scattering terms 
+				+A[i,:]* (1. - exp(-dtau[i,:] *(ubar0+1*ubar1)/(ubar0*ubar1)))*
+				(ubar0/(ubar0+1*ubar1))
+				+G[i,:]*(exp(exptrm[i,:]*1-dtau[i,:]/ubar1) - 1.0)/(lamda[i,:]*1*ubar1 - 1.0)
+				+H[i,:]*(1. - exp(-exptrm[i,:]*1-dtau[i,:]/ubar1))/(lamda[i,:]*1*ubar1 + 1.0))
+
+	return xint[0,:]
+
+@jit(nopython=True, cache=True, nogil=True)
 def get_reflected_1d(nlevel, wno,nwno, numg,numt, dtau, tau, w0, cosb,gcos2, ftau_cld, ftau_ray,
 	dtau_og, tau_og, w0_og, cosb_og, 
 	surf_reflect,ubar0, ubar1,cos_theta, F0PI,single_phase, multi_phase,
@@ -752,169 +871,285 @@ def get_reflected_1d(nlevel, wno,nwno, numg,numt, dtau, tau, w0, cosb,gcos2, fta
 
 	xint_at_top = zeros((numg, numt, nwno))
 
-	nlayer = nlevel - 1 
+	#================ TERMS NOT DEPENDENT ON FACET ================
+	#In 1d the optical properties are the same for every facet, so anything that doesn't 
+	#depend on ubar0 or ubar1 is computed once here instead of inside the angle loop 
+	g1, g2, lamda, gama, f0pi_w0, exptrm_positive, exptrm_minus, single_scat = setup_reflected_1d(
+				dtau, w0, cosb, gcos2, ftau_cld, ftau_ray, w0_og, cosb_og, cos_theta, F0PI, 
+				single_phase, frac_a, frac_b, frac_c, constant_back, constant_forward)
+
+	#================ START CRAZE LOOP OVER ANGLE #================
+	for ng in range(numg):
+		for nt in range(numt):
+			u0 = ubar0[ng, nt] #ubar has dimensions [gauss angles by tchebyshev angles ]
+			u1 = ubar1[ng, nt]
+			xint_at_top[ng,nt,:] = get_reflected_angle(nlevel, nwno, u0, u1, dtau, tau, w0, cosb, gcos2, 
+										tau_og, exp(-dtau_og/u1), surf_reflect, F0PI, multi_phase,
+										g1, g2, lamda, gama, f0pi_w0, exptrm_positive, exptrm_minus, single_scat)
+	return xint_at_top
+
+@jit(nopython=True, cache=True)
+def setup_reflected_1d(dtau, w0, cosb, gcos2, ftau_cld, ftau_ray, w0_og, cosb_og, cos_theta, F0PI, 
+	single_phase, frac_a, frac_b, frac_c, constant_back, constant_forward):
+	"""
+	Computes all the reflected light terms that do not depend on the facet of the disco ball 
+	(Toon 1989 Table 1 terms that don't need ubar0, the layer exponentials and the single 
+	scattering phase function). See `get_reflected_1d` for a description of the inputs. 
 
+	Returns
+	-------
+	g1, g2, lamda, gama, F0PI*w0, exptrm_positive, exptrm_minus, single_scat
+		Each with dimensions # layer by # wave 
+	"""
 	#now define terms of Toon et al 1989 quadrature Table 1 
 	#https://agupubs.onlinelibrary.wiley.com/doi/pdf/10.1029/JD094iD13p16287
 	#see table of terms 
-
-	#terms not dependent on incident angle
 	sq3 = sqrt(3.)
 	g1	= (sq3*0.5)*(2. - w0*(1.+cosb))	#table 1
 	g2	= (sq3*w0*0.5)*(1.-cosb)		#table 1
 	lamda = sqrt(g1**2 - g2**2)			#eqn 21
 	gama  = (g1-lamda)/g2				#eqn 22
+	f0pi_w0 = F0PI*w0
 
-	#================ START CRAZE LOOP OVER ANGLE #================
-	for ng in range(numg):
-		for nt in range(numt):
+	#calculate exponential terms needed for the tridiagonal rotated layered method
+	exptrm = lamda*dtau
+	#save from overflow 
+	exptrm = slice_gt (exptrm, 35.0) 
+
+	exptrm_positive = exp(exptrm) #EP
+	exptrm_minus = 1.0/exptrm_positive#exp(-exptrm) #EM
+
+	################################ BEGIN OPTIONS FOR DIRECT SCATTERING####################
+	#define f (fraction of forward to back scattering), 
+	#g_forward (forward asymmetry), g_back (backward asym)
+	#needed for everything except the OTHG
+	if single_phase!=1: 
+		g_forward = constant_forward*cosb_og
+		g_back = -constant_back*cosb_og
+		f = frac_a + frac_b*g_back**frac_c
+
+
+	if single_phase==0:#'cahoy':
+		#Phase function for single scattering albedo frum Solar beam
+		#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
+			  #first term of TTHG: forward scattering
+		p_single=(f * (1-g_forward**2)
+						/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+						#second term of TTHG: backward scattering
+						+(1-f)*(1-g_back**2)
+						/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3)+
+						#rayleigh phase function
+						(gcos2))
+	elif single_phase==1:#'OTHG':
+		p_single=(1-cosb_og**2)/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+	elif single_phase==2:#'TTHG':
+		#Phase function for single scattering albedo frum Solar beam
+		#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
+			  #first term of TTHG: forward scattering
+		p_single=(f * (1-g_forward**2)
+						/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+						#second term of TTHG: backward scattering
+						+(1-f)*(1-g_back**2)
+						/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))
+	elif single_phase==3:#'TTHG_ray':
+		#Phase function for single scattering albedo frum Solar beam
+		#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
+			  		#first term of TTHG: forward scattering
+		p_single=(ftau_cld*(f * (1-g_forward**2)
+										/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
+										#second term of TTHG: backward scattering
+										+(1-f)*(1-g_back**2)
+										/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))+			
+						#rayleigh phase function
+						ftau_ray*(0.75*(1+cos_theta**2.0)))
+
+	#single scattering albedo from sun beam without the angle dependent terms
+	single_scat = (w0_og*F0PI/(4.*pi))*p_single
+	################################ END OPTIONS FOR DIRECT SCATTERING####################
+
+	return g1, g2, lamda, gama, f0pi_w0, exptrm_positive, exptrm_minus, single_scat
+
+@jit(nopython=True, cache=True)
+def get_reflected_angle(nlevel, nwno, u0, u1, dtau, tau, w0, cosb, gcos2, tau_og, exptrm_angle_og, 
+	surf_reflect, F0PI, multi_phase, g1, g2, lamda, gama, f0pi_w0, exptrm_positive, exptrm_minus, single_scat):
+	"""
+	Computes the reflected intensity at the top of a 1d atmosphere for a single facet 
+	(ubar0, ubar1) of the disco ball, given the facet independent terms from `setup_reflected_1d`. 
 
-			g3	= 0.5*(1.-sq3*cosb*ubar0[ng, nt])   #table 1 #ubar has dimensions [gauss angles by tchebyshev angles ]
+	Parameters
+	----------
+	u0 : float 
+		Cosine of the incident angle of this facet
+	u1 : float 
+		Cosine of the observer angle of this facet
+	exptrm_angle_og : ndarray of float 
+		exp(-dtau_og/u1), attenuation of each layer along the outgoing angle WITHOUT 
+		the delta eddington correction. Passed in so it can be shared with the thermal calculation. 
+	g1, g2, lamda, gama, f0pi_w0, exptrm_positive, exptrm_minus, single_scat : ndarray of float 
+		Output of `setup_reflected_1d`
 	
-			# now calculate c_plus and c_minus (equation 23 and 24 toon)
-			g4 = 1.0 - g3
-			denominator = lamda**2 - 1.0/ubar0[ng, nt]**2.0
-
-			#everything but the exponential 
-			a_minus = F0PI*w0* (g4*(g1 + 1.0/ubar0[ng, nt]) +g2*g3 ) / denominator
-			a_plus  = F0PI*w0*(g3*(g1-1.0/ubar0[ng, nt]) +g2*g4) / denominator
-
-			#add in exponential to get full eqn
-			#_up is the terms evaluated at lower optical depths (higher altitudes)
-			#_down is terms evaluated at higher optical depths (lower altitudes)
-			x = exp(-tau[:-1,:]/ubar0[ng, nt])
-			c_minus_up = a_minus*x #CMM1
-			c_plus_up  = a_plus*x #CPM1
-			x = exp(-tau[1:,:]/ubar0[ng, nt])
-			c_minus_down = a_minus*x #CM
-			c_plus_down  = a_plus*x #CP
-
-			#calculate exponential terms needed for the tridiagonal rotated layered method
-			exptrm = lamda*dtau
-			#save from overflow 
-			exptrm = slice_gt (exptrm, 35.0) 
-
-			exptrm_positive = exp(exptrm) #EP
-			exptrm_minus = 1.0/exptrm_positive#exp(-exptrm) #EM
-
-
-			#boundary conditions 
-			b_top = 0.0										  
-			b_surface = 0. + surf_reflect*ubar0[ng, nt]*F0PI*exp(-tau[-1, :]/ubar0[ng, nt])
-
-			#Now we need the terms for the tridiagonal rotated layered method
-			A, B, C, D = setup_tri_diag(nlayer,nwno,  c_plus_up, c_minus_up, 
-									c_plus_down, c_minus_down, b_top, b_surface, surf_reflect,
-									gama, dtau, 
-									exptrm_positive,  exptrm_minus) 
+	See `get_reflected_1d` for all other inputs. 
 
-			positive = zeros((nlayer, nwno))
-			negative = zeros((nlayer, nwno))
-			#========================= Start loop over wavelength =========================
-			L = 2*nlayer
-			for w in range(nwno):
-				#coefficient of posive and negative exponential terms 
-				X = tri_diag_solve(L, A[:,w], B[:,w], C[:,w], D[:,w])
-
-				#unmix the coefficients
-				positive[:,w] = X[::2] + X[1::2] 
-				negative[:,w] = X[::2] - X[1::2]
-			#========================= End loop over wavelength =========================
-
-			#use expression for bottom flux to get the flux_plus and flux_minus at last
-			#bottom layer
-			flux_zero  = positive[-1,:]*exptrm_positive[-1,:] + gama[-1,:]*negative[-1,:]*exptrm_minus[-1,:] + c_plus_down[-1,:]
-			
-			xint = zeros((nlevel,nwno))
-			xint[-1,:] = flux_zero/pi
-
-			################################ BEGIN OPTIONS FOR MULTIPLE SCATTERING####################
-
-			#Legendre polynomials for the Phase function due to multiple scatterers 
-			if multi_phase ==0:#'N=2':
-				#ubar2 is defined to deal with the integration over the second moment of the 
-				#intensity. It is FIT TO PURE RAYLEIGH LIMIT, ~(1/sqrt(3))^(1/2)
-				#this is a decent assumption because our second order legendre polynomial 
-				#is forced to be equal to the rayleigh phase function
-				ubar2 = 0.767  # 
-				multi_plus = (1.0+1.5*cosb*ubar1[ng,nt] #!was 3
-								+ gcos2*(3.0*ubar2*ubar2*ubar1[ng,nt]*ubar1[ng,nt] - 1.0)/2.0)
-				multi_minus = (1.-1.5*cosb*ubar1[ng,nt] 
-								+ gcos2*(3.0*ubar2*ubar2*ubar1[ng,nt]*ubar1[ng,nt] - 1.0)/2.0)
-			elif multi_phase ==1:#'N=1':
-				multi_plus = 1.0+1.5*cosb*ubar1[ng,nt]	
-				multi_minus = 1.-1.5*cosb*ubar1[ng,nt]
-			################################ END OPTIONS FOR MULTIPLE SCATTERING####################
-
-			G=w0*positive*(multi_plus+gama*multi_minus)
-			H=w0*negative*(gama*multi_plus+multi_minus)
-			A=w0*(multi_plus*c_plus_up+multi_minus*c_minus_up)
-
-			G=G*0.5/pi
-			H=H*0.5/pi
-			A=A*0.5/pi
-
-			################################ BEGIN OPTIONS FOR DIRECT SCATTERING####################
-			#define f (fraction of forward to back scattering), 
-			#g_forward (forward asymmetry), g_back (backward asym)
-			#needed for everything except the OTHG
-			if single_phase!=1: 
-				g_forward = constant_forward*cosb_og
-				g_back = -constant_back*cosb_og
-				f = frac_a + frac_b*g_back**frac_c
-
-
-			if single_phase==0:#'cahoy':
-				#Phase function for single scattering albedo frum Solar beam
-				#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
-					  #first term of TTHG: forward scattering
-				p_single=(f * (1-g_forward**2)
-								/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-								#second term of TTHG: backward scattering
-								+(1-f)*(1-g_back**2)
-								/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3)+
-								#rayleigh phase function
-								(gcos2))
-			elif single_phase==1:#'OTHG':
-				p_single=(1-cosb_og**2)/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-			elif single_phase==2:#'TTHG':
-				#Phase function for single scattering albedo frum Solar beam
-				#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
-					  #first term of TTHG: forward scattering
-				p_single=(f * (1-g_forward**2)
-								/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-								#second term of TTHG: backward scattering
-								+(1-f)*(1-g_back**2)
-								/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))
-			elif single_phase==3:#'TTHG_ray':
-				#Phase function for single scattering albedo frum Solar beam
-				#uses the Two term Henyey-Greenstein function with the additiona rayleigh component 
-					  		#first term of TTHG: forward scattering
-				p_single=(ftau_cld*(f * (1-g_forward**2)
-												/sqrt((1+cosb_og**2+2*cosb_og*cos_theta)**3) 
-												#second term of TTHG: backward scattering
-												+(1-f)*(1-g_back**2)
-												/sqrt((1+(-cosb_og/2.)**2+2*(-cosb_og/2.)*cos_theta)**3))+			
-								#rayleigh phase function
-								ftau_ray*(0.75*(1+cos_theta**2.0)))
-
-			################################ END OPTIONS FOR DIRECT SCATTERING####################
-
-			for i in range(nlayer-1,-1,-1):
-						#direct beam
-				xint[i,:] =( xint[i+1,:]*exp(-dtau[i,:]/ubar1[ng,nt]) 
-						#single scattering albedo from sun beam (from ubar0 to ubar1)
-						+(w0_og[i,:]*F0PI/(4.*pi))*
-						(p_single[i,:])*exp(-tau_og[i,:]/ubar0[ng,nt])*
-						(1. - exp(-dtau_og[i,:]*(ubar0[ng,nt]+ubar1[ng,nt])/(ubar0[ng,nt]*ubar1[ng,nt])))*
-						(ubar0[ng,nt]/(ubar0[ng,nt]+ubar1[ng,nt]))
-						#multiple scattering terms p_single
-						+A[i,:]*(1. - exp(-dtau[i,:] *(ubar0[ng,nt]+1*ubar1[ng,nt])/(ubar0[ng,nt]*ubar1[ng,nt])))*
-						(ubar0[ng,nt]/(ubar0[ng,nt]+1*ubar1[ng,nt]))
-						+G[i,:]*(exp(exptrm[i,:]*1-dtau[i,:]/ubar1[ng,nt]) - 1.0)/(lamda[i,:]*1*ubar1[ng,nt] - 1.0)
-						+H[i,:]*(1. - exp(-exptrm[i,:]*1-dtau[i,:]/ubar1[ng,nt]))/(lamda[i,:]*1*ubar1[ng,nt] + 1.0))
-			xint_at_top[ng,nt,:] = xint[0,:]	
-	return xint_at_top
+	Returns
+	-------
+	intensity at the top of the atmosphere for this facet (nwno)
+	"""
+	nlayer = nlevel - 1 
+	sq3 = sqrt(3.)
+
+	g3	= 0.5*(1.-sq3*cosb*u0)   #table 1 
+
+	# now calculate c_plus and c_minus (equation 23 and 24 toon)
+	g4 = 1.0 - g3
+	denominator = lamda**2 - 1.0/u0**2.0
+
+	#everything but the exponential 
+	a_minus = f0pi_w0* (g4*(g1 + 1.0/u0) +g2*g3 ) / denominator
+	a_plus  = f0pi_w0*(g3*(g1-1.0/u0) +g2*g4) / denominator
+
+	#add in exponential to get full eqn
+	#_up is the terms evaluated at lower optical depths (higher altitudes)
+	#_down is terms evaluated at higher optical depths (lower altitudes)
+	#the direct beam is attenuated once at every level and sliced into top and bottom 
+	x = exp(-tau/u0)
+	c_minus_up = a_minus*x[:-1,:] #CMM1
+	c_plus_up  = a_plus*x[:-1,:] #CPM1
+	c_minus_down = a_minus*x[1:,:] #CM
+	c_plus_down  = a_plus*x[1:,:] #CP
+
+	#boundary conditions 
+	b_top = 0.0										  
+	b_surface = 0. + surf_reflect*u0*F0PI*x[-1, :]
+
+	#Now we need the terms for the tridiagonal rotated layered method
+	A, B, C, D = setup_tri_diag(nlayer,nwno,  c_plus_up, c_minus_up, 
+							c_plus_down, c_minus_down, b_top, b_surface, surf_reflect,
+							gama, dtau, 
+							exptrm_positive,  exptrm_minus) 
+
+	L = 2*nlayer
+	#coefficient of posive and negative exponential terms, for all wavelengths 
+	X = tri_diag_solve_wno(L, A, B, C, D)
+
+	#unmix the coefficients
+	positive = X[::2,:] + X[1::2,:] 
+	negative = X[::2,:] - X[1::2,:]
+
+	#use expression for bottom flux to get the flux_plus and flux_minus at last
+	#bottom layer
+	flux_zero  = positive[-1,:]*exptrm_positive[-1,:] + gama[-1,:]*negative[-1,:]*exptrm_minus[-1,:] + c_plus_down[-1,:]
+	
+	xint = zeros((nlevel,nwno))
+	xint[-1,:] = flux_zero/pi
+
+	################################ BEGIN OPTIONS FOR MULTIPLE SCATTERING####################
+
+	#Legendre polynomials for the Phase function due to multiple scatterers 
+	if multi_phase ==0:#'N=2':
+		#ubar2 is defined to deal with the integration over the second moment of the 
+		#intensity. It is FIT TO PURE RAYLEIGH LIMIT, ~(1/sqrt(3))^(1/2)
+		#this is a decent assumption because our second order legendre polynomial 
+		#is forced to be equal to the rayleigh phase function
+		ubar2 = 0.767  # 
+		multi_plus = (1.0+1.5*cosb*u1 #!was 3
+						+ gcos2*(3.0*ubar2*ubar2*u1*u1 - 1.0)/2.0)
+		multi_minus = (1.-1.5*cosb*u1 
+						+ gcos2*(3.0*ubar2*ubar2*u1*u1 - 1.0)/2.0)
+	elif multi_phase ==1:#'N=1':
+		multi_plus = 1.0+1.5*cosb*u1	
+		multi_minus = 1.-1.5*cosb*u1
+	################################ END OPTIONS FOR MULTIPLE SCATTERING####################
+
+	G=w0*positive*(multi_plus+gama*multi_minus)
+	H=w0*negative*(gama*multi_plus+multi_minus)
+	#without the direct beam attenuation, which is applied below at the top and bottom of each layer
+	A=w0*(multi_plus*a_plus+multi_minus*a_minus)
+
+	G=G*0.5/pi
+	H=H*0.5/pi
+	A=A*0.5/pi
+
+	#attenuation along the outgoing angle. exp(+-exptrm - dtau/u1) is split 
+	#into the hoisted exptrm_positive/minus times this so it is only computed once
+	exptrm_angle = exp(-dtau/u1)
+
+	#exp(-tau[:-1]/u0)*(1-exp(-dtau*(u0+u1)/(u0*u1))) is the same as 
+	#exp(-tau[:-1]/u0) - exp(-tau[1:]/u0)*exp(-dtau/u1), which reuses the attenuation at each level 
+	x_og = exp(-tau_og/u0)
+
+	#every source term in each layer, so the loop below is just the recursion 
+	source = ( #single scattering albedo from sun beam (from ubar0 to ubar1)
+			single_scat*(x_og[:-1,:] - x_og[1:,:]*exptrm_angle_og)*
+			(u0/(u0+u1))
+			#multiple scattering terms p_single
+			+A*(x[:-1,:] - x[1:,:]*exptrm_angle)*
+			(u0/(u0+1*u1))
+			+G*(exptrm_positive*exptrm_angle - 1.0)/(lamda*1*u1 - 1.0)
+			+H*(1. - exptrm_minus*exptrm_angle)/(lamda*1*u1 + 1.0))
+
+	for i in range(nlayer-1,-1,-1):
+		#direct beam
+		xint[i,:] = xint[i+1,:]*exptrm_angle[i,:] + source[i,:]
+
+	return xint[0,:]
+
+@jit(nopython=True, cache=True, parallel=True)
+def get_reflected_thermal_1d(nlevel, wno,nwno, numg,numt, dtau, tau, w0, cosb,gcos2, ftau_cld, ftau_ray,
+	dtau_og, tau_og, w0_og, cosb_og, 
+	surf_reflect,ubar0, ubar1,cos_theta, F0PI,single_phase, multi_phase,
+	frac_a, frac_b, frac_c, constant_back, constant_forward, tlevel, plevel):
+	"""
+	Computes both the reflected light intensity and the thermal emission at the top of a 1d atmosphere 
+	in one pass over the disco ball. This gives the same answer as `get_reflected_1d` and `get_thermal_1d` 
+	but shares the facet loop and the attenuation of each layer along the outgoing angle, 
+	exp(-dtau_og/ubar1). The two stream closures are different for the two calculations 
+	(quadrature vs. hemispheric mean) so their Toon coefficients are still computed separately. 
+	Like `get_thermal_1d`, the facets are computed in parallel (see `precompile.benchmark_reflected_thermal`). 
+
+	Parameters
+	----------
+	tlevel : ndarray of float 
+		Temperature at each level (K)
+	plevel : ndarray of float 
+		Pressure at each level 
+
+	See `get_reflected_1d` for all other inputs. 
+
+	Returns
+	-------
+	xint_at_top, flux_at_top 
+		Reflected intensity and thermal flux at the top of the atmosphere (numg x numt x nwno)
+	"""
+	xint_at_top = zeros((numg, numt, nwno))
+	flux_at_top = zeros((numg, numt, nwno))
+
+	#================ TERMS NOT DEPENDENT ON FACET ================
+	g1, g2, lamda, gama, f0pi_w0, exptrm_positive, exptrm_minus, single_scat = setup_reflected_1d(
+				dtau, w0, cosb, gcos2, ftau_cld, ftau_ray, w0_og, cosb_og, cos_theta, F0PI, 
+				single_phase, frac_a, frac_b, frac_c, constant_back, constant_forward)
+
+	(b1, b_surface, lamda_th, exptrm_positive_th, exptrm_minus_th, exptrm_positive_mdpt, exptrm_minus_mdpt, 
+		G_th, H_th, alpha1, alpha2) = setup_thermal_1d(nlevel, wno, nwno, tlevel, dtau_og, w0_og, cosb_og, plevel)
+
+	#================ START CRAZE LOOP OVER ANGLE #================
+	#flatten the facets so that they can all be farmed out in parallel
+	for i in prange(numg*numt):
+		ng = i // numt
+		nt = i % numt
+		u0 = ubar0[ng, nt]
+		u1 = ubar1[ng, nt]
+		#shared by the single scattering and thermal source terms
+		exptrm_angle_og = exp(-dtau_og/u1)
+
+		xint_at_top[ng,nt,:] = get_reflected_angle(nlevel, nwno, u0, u1, dtau, tau, w0, cosb, gcos2, 
+									tau_og, exptrm_angle_og, surf_reflect, F0PI, multi_phase,
+									g1, g2, lamda, gama, f0pi_w0, exptrm_positive, exptrm_minus, single_scat)
+
+		flux_at_top[ng,nt,:] = get_thermal_angle(nlevel, nwno, u1, dtau_og, exptrm_angle_og, 
+									b1, b_surface, lamda_th, exptrm_positive_th, exptrm_minus_th, 
+									exptrm_positive_mdpt, exptrm_minus_mdpt, G_th, H_th, alpha1, alpha2)
+
+	return xint_at_top, flux_at_top
 
 @jit(nopython=True, cache=True)
 def blackbody(t,w):
@@ -938,9 +1173,160 @@ def blackbody(t,w):
 
 	return ((2.0*h*c**2.0)/(w**5.0))*(1.0/(exp((h*c)/outer(t, w*k)) - 1.0))
 
-@jit(nopython=True, cache=True)
+@jit(nopython=True, cache=True, parallel=True)
 def get_thermal_1d(nlevel, wno,nwno, numg,numt,tlevel, dtau, w0,cosb,plevel, ubar1):
-	
+	"""
+	Computes the thermal emission at the top of a 1d atmosphere for every facet of the disco ball. 
+	The tridiagonal solve does not depend on angle, so it is done once in `setup_thermal_1d` and 
+	the facets, which are independent of each other, are computed in parallel. 
+
+	Parameters
+	----------
+	nlevel : int 
+		Number of levels in the model 
+	wno : array of float 
+		Wave number grid in cm -1 
+	nwno : int 
+		Number of wave points
+	numg : int 
+		Number of Gauss angles 
+	numt : int 
+		Number of Chebyshev angles 
+	tlevel : ndarray of float 
+		Temperature at each level (K)
+	dtau : ndarray of float
+		Opacity per layer, Dimensions=# layer by # wave
+	w0 : ndarray of float 
+		Single scattering albedo, Dimensions=# layer by # wave
+	cosb : ndarray of float 
+		Asymmetry factor, Dimensions=# layer by # wave
+	plevel : ndarray of float 
+		Pressure at each level 
+	ubar1 : ndarray of float 
+		matrix of cosine of the observer angles
+
+	Returns
+	-------
+	thermal flux at the top of the atmosphere (numg x numt x nwno)
+	"""
+	#================ TERMS NOT DEPENDENT ON FACET ================
+	(b1, b_surface, lamda, exptrm_positive, exptrm_minus, exptrm_positive_mdpt, exptrm_minus_mdpt, 
+		G, H, alpha1, alpha2) = setup_thermal_1d(nlevel, wno, nwno, tlevel, dtau, w0, cosb, plevel)
+
+	#================ START CRAZE LOOP OVER ANGLE #================
+	flux_at_top = zeros((numg, numt, nwno))
+
+	for i in prange(numg*numt):
+		ng = i // numt
+		nt = i % numt
+		flux_at_top[ng,nt,:] = get_thermal_angle(nlevel, nwno, ubar1[ng,nt], dtau, exp(-dtau/ubar1[ng,nt]), 
+									b1, b_surface, lamda, exptrm_positive, exptrm_minus, 
+									exptrm_positive_mdpt, exptrm_minus_mdpt, G, H, alpha1, alpha2)
+
+	return flux_at_top # numg x numt x nwno
+
+@jit(nopython=True, cache=True, parallel=True)
+def get_thermal_3d(nlevel, wno,nwno, numg,numt,tlevel_3d, dtau_3d, w0_3d,cosb_3d,plevel_3d, ubar1):
+	"""
+	Computes the thermal emission at the top of the atmosphere for every facet of the disco ball 
+	when each facet has its own atmosphere. This is the same as `get_thermal_1d` but with a 
+	separate tridiagonal solve per facet. All the 3d inputs are facet-major so that each facet 
+	is a contiguous block, and facets are computed in parallel. 
+
+	Parameters
+	----------
+	nlevel : int 
+		Number of levels in the model 
+	wno : array of float 
+		Wave number grid in cm -1 
+	nwno : int 
+		Number of wave points
+	numg : int 
+		Number of Gauss angles 
+	numt : int 
+		Number of Chebyshev angles 
+	tlevel_3d : ndarray of float 
+		Temperature at each level (K), Dimensions=# gauss angles by # tchebyshev angles by # level
+	dtau_3d : ndarray of float
+		Opacity per layer, Dimensions=# gauss angles by # tchebyshev angles by # layer by # wave
+	w0_3d : ndarray of float 
+		Single scattering albedo, Dimensions=# gauss angles by # tchebyshev angles by # layer by # wave
+	cosb_3d : ndarray of float 
+		Asymmetry factor, Dimensions=# gauss angles by # tchebyshev angles by # layer by # wave
+	plevel_3d : ndarray of float 
+		Pressure at each level, Dimensions=# gauss angles by # tchebyshev angles by # level
+	ubar1 : ndarray of float 
+		matrix of cosine of the observer angles
+
+	Returns
+	-------
+	thermal flux at the top of the atmosphere (numg x numt x nwno)
+	"""
+	flux_at_top = zeros((numg, numt, nwno))
+
+	for i in prange(numg*numt):
+		ng = i // numt
+		nt = i % numt
+		flux_at_top[ng,nt,:] = get_thermal_facet(nlevel, wno, nwno, tlevel_3d[ng,nt], dtau_3d[ng,nt], 
+									w0_3d[ng,nt], cosb_3d[ng,nt], plevel_3d[ng,nt], ubar1[ng,nt])
+
+	return flux_at_top # numg x numt x nwno
+
+@jit(nopython=True, cache=True)
+def get_thermal_facet(nlevel, wno, nwno, tlevel, dtau, w0, cosb, plevel, u1):
+	"""
+	Computes the thermal emission at the top of the atmosphere for a single facet of the 
+	disco ball with its own atmosphere. This is the per-facet work of `get_thermal_3d`. 
+
+	Parameters
+	----------
+	tlevel, dtau, w0, cosb, plevel : ndarray of float 
+		Atmosphere of this facet (see `get_thermal_3d`)
+	u1 : float 
+		Cosine of the observer angle of this facet 
+
+	Returns
+	-------
+	thermal flux at the top of the atmosphere for this facet (nwno)
+	"""
+	(b1, b_surface, lamda, exptrm_positive, exptrm_minus, exptrm_positive_mdpt, exptrm_minus_mdpt, 
+		G, H, alpha1, alpha2) = setup_thermal_1d(nlevel, wno, nwno, tlevel, dtau, w0, cosb, plevel)
+
+	return get_thermal_angle(nlevel, nwno, u1, dtau, exp(-dtau/u1), 
+				b1, b_surface, lamda, exptrm_positive, exptrm_minus, 
+				exptrm_positive_mdpt, exptrm_minus_mdpt, G, H, alpha1, alpha2)
+
+@jit(nopython=True, cache=True)
+def setup_thermal_1d(nlevel, wno, nwno, tlevel, dtau, w0, cosb, plevel):
+	"""
+	Computes the thermal emission terms that do not depend on the outgoing angle. This includes 
+	the blackbody source, the Toon 1989 hemispheric mean coefficients and the tridiagonal solve, 
+	which for thermal emission only has to happen once per atmosphere. 
+
+	Parameters
+	----------
+	nlevel : int 
+		Number of levels in the model 
+	wno : array of float 
+		Wave number grid in cm -1 
+	nwno : int 
+		Number of wave points
+	tlevel : ndarray of float 
+		Temperature at each level (K)
+	dtau : ndarray of float
+		Opacity per layer, Dimensions=# layer by # wave
+	w0 : ndarray of float 
+		Single scattering albedo, Dimensions=# layer by # wave
+	cosb : ndarray of float 
+		Asymmetry factor, Dimensions=# layer by # wave
+	plevel : ndarray of float 
+		Pressure at each level 
+
+	Returns
+	-------
+	b1, b_surface, lamda, exptrm_positive, exptrm_minus, exptrm_positive_mdpt, exptrm_minus_mdpt, G, H, alpha1, alpha2
+		The midpoint exponentials are only for the top layer (nwno), everything else is # layer by # wave 
+	"""
 	nlayer = nlevel -1 #nlayers 
 
 	mu1 = 0.5 #from Table 1 Toon  
@@ -986,86 +1372,73 @@ def get_thermal_1d(nlevel, wno,nwno, numg,numt,tlevel, dtau, w0,cosb,plevel, uba
 							c_plus_down, c_minus_down, b_top, b_surface, surf_reflect,
 							gama, dtau, 
 							exptrm_positive,  exptrm_minus) 
-	positive = zeros((nlayer, nwno))
-	negative = zeros((nlayer, nwno))
-	#========================= Start loop over wavelength =========================
 	L = nlayer+nlayer
-	for w in range(nwno):
-		#coefficient of posive and negative exponential terms 
-		X = tri_diag_solve(L, A[:,w], B[:,w], C[:,w], D[:,w])
+	#coefficient of posive and negative exponential terms, for all wavelengths 
+	X = tri_diag_solve_wno(L, A, B, C, D)
 
-		#unmix the coefficients
-		positive[:,w] = X[::2] + X[1::2] 
-		negative[:,w] = X[::2] - X[1::2]
-
-	f_up = pi*(positive * exptrm_positive + gama * negative * exptrm_minus + c_plus_up)
+	#unmix the coefficients
+	positive = X[::2,:] + X[1::2,:] 
+	negative = X[::2,:] - X[1::2,:]
 
 	#calculate everyting from Table 3 toon
+	#the downward terms (J, K, sigma1, sigma2) aren't needed for the upward flux at the top
 	alphax = ((1.0-w0)/(1.0-w0*cosb))**0.5
 	G = twopi*w0*positive*(1.0+cosb*alphax)/(1.0+alphax)
 	H = twopi*w0*negative*(1.0-cosb*alphax)/(1.0+alphax)
-	J = twopi*w0*positive*(1.0-cosb*alphax)/(1.0+alphax)
-	K = twopi*w0*negative*(1.0+cosb*alphax)/(1.0+alphax)
 	alpha1 = twopi*(b0+ b1*(mu1*w0*cosb/(1.0-w0*cosb)))
 	alpha2 = twopi*b1
-	sigma1 = twopi*(b0- b1*(mu1*w0*cosb/(1.0-w0*cosb)))
-	sigma2 = twopi*b1
-
-	flux_minus = zeros((nlevel,nwno))
-	flux_plus = zeros((nlevel,nwno))
-	flux_minus_mdpt = zeros((nlevel,nwno))
-	flux_plus_mdpt = zeros((nlevel,nwno))
 
-	exptrm_positive_mdpt = exp(0.5*exptrm) 
+	#only the midpoint of the top layer is ever used 
+	exptrm_positive_mdpt = exp(0.5*exptrm[0,:]) 
 	exptrm_minus_mdpt = 1/exptrm_positive_mdpt 
 
-	#================ START CRAZE LOOP OVER ANGLE #================
-	flux_at_top = zeros((numg, numt, nwno))
-	flux_down = zeros((numg, numt, nwno))
+	return (b1, b_surface, lamda, exptrm_positive, exptrm_minus, exptrm_positive_mdpt, exptrm_minus_mdpt, 
+				G, H, alpha1, alpha2)
 
-	#work through building eqn 55 in toon (tons of bookeeping exponentials)
-	for ng in range(numg):
-		for nt in range(numt): 
-			flux_plus[-1,:] = twopi * (b_surface + b1[-1,:] * ubar1[ng,nt])
-			flux_minus[0,:] = twopi * (1 - exp(-tau_top / ubar1[ng,nt])) * all_b[0,:]
-			
-			exptrm_angle = exp( - dtau / ubar1[ng,nt])
-			exptrm_angle_mdpt = exp( -0.5 * dtau / ubar1[ng,nt]) 
-
-			for itop in range(nlayer):
-
-				#disbanning this for now because we dont need it in the thermal emission code
-				#flux_minus[itop+1,:]=(flux_minus[itop,:]*exptrm_angle[itop,:]+
-				#	                 (J[itop,:]/(lamda[itop,:]*ubar1[ng,nt]+1.0))*(exptrm_positive[itop,:]-exptrm_angle[itop,:])+
-				#	                 (K[itop,:]/(lamda[itop,:]*ubar1[ng,nt]-1.0))*(exptrm_angle[itop,:]-exptrm_minus[itop,:])+
-				#	                 sigma1[itop,:]*(1.-exptrm_angle[itop,:])+
-				#	                 sigma2[itop,:]*(ubar1[ng,nt]*exptrm_angle[itop,:]+dtau[itop,:]-ubar1[ng,nt]) )
-
-				#flux_minus_mdpt[itop,:]=(flux_minus[itop,:]*exptrm_angle_mdpt[itop,:]+
-				#                        (J[itop,:]/(lamda[itop,:]*ubar1[ng,nt]+1.0))*(exptrm_positive_mdpt[itop,:]-exptrm_angle_mdpt[itop,:])+
-				#                        (K[itop,:]/(-lamda[itop,:]*ubar1[ng,nt]+1.0))*(exptrm_minus_mdpt[itop,:]-exptrm_angle_mdpt[itop,:])+
-				#                        sigma1[itop,:]*(1.-exptrm_angle_mdpt[itop,:])+
-				#                        sigma2[itop,:]*(ubar1[ng,nt]*exptrm_angle_mdpt[itop,:]+0.5*dtau[itop,:]-ubar1[ng,nt]))
-
-				ibot=nlayer-1-itop
-
-				flux_plus[ibot,:]=(flux_plus[ibot+1,:]*exptrm_angle[ibot,:]+
-				                  (G[ibot,:]/(lamda[ibot,:]*ubar1[ng,nt]-1.0))*(exptrm_positive[ibot,:]*exptrm_angle[ibot,:]-1.0)+
-				                  (H[ibot,:]/(lamda[ibot,:]*ubar1[ng,nt]+1.0))*(1.0-exptrm_minus[ibot,:] * exptrm_angle[ibot,:])+
-				                  alpha1[ibot,:]*(1.-exptrm_angle[ibot,:])+
-				                  alpha2[ibot,:]*(ubar1[ng,nt]-(dtau[ibot,:]+ubar1[ng,nt])*exptrm_angle[ibot,:]) )
-
-				flux_plus_mdpt[ibot,:]=(flux_plus[ibot+1,:]*exptrm_angle_mdpt[ibot,:]+
-				                       (G[ibot,:]/(lamda[ibot,:]*ubar1[ng,nt]-1.0))*(exptrm_positive[ibot,:]*exptrm_angle_mdpt[ibot,:]-exptrm_positive_mdpt[ibot,:])-
-				                       (H[ibot,:]/(lamda[ibot,:]*ubar1[ng,nt]+1.0))*(exptrm_minus[ibot,:]*exptrm_angle_mdpt[ibot,:]-exptrm_minus_mdpt[ibot,:])+
-				                       alpha1[ibot,:]*(1.-exptrm_angle_mdpt[ibot,:])+
-				                       alpha2[ibot,:]*(ubar1[ng,nt]+0.5*dtau[ibot,:]-(dtau[ibot,:]+ubar1[ng,nt])*exptrm_angle_mdpt[ibot,:])  )
-
-		flux_at_top[ng,nt,:] = flux_plus_mdpt[0,:] #nlevel by nwno
-		#flux_down[ng,nt,:] = flux_minus_mdpt[0,:] #nlevel by nwno, Dont really need to compute this for now
-		
-		#for testing purposes
-		#import pickle as pk
-		#pk.dump([flux_at_top, flux_down, flux_minus, flux_minus_mdpt, flux_plus, flux_plus_mdpt], open('/Users/natashabatalha/Documents/PICASO/test/thermal/debugthermal.pk','wb'))
-
-	return flux_at_top #, flux_down# numg x numt x nwno
+@jit(nopython=True, cache=True)
+def get_thermal_angle(nlevel, nwno, u1, dtau, exptrm_angle, b1, b_surface, lamda, exptrm_positive, exptrm_minus, 
+	exptrm_positive_mdpt, exptrm_minus_mdpt, G, H, alpha1, alpha2):
+	"""
+	Computes the thermal flux at the top of the atmosphere along a single outgoing angle by 
+	building eqn 55 in toon (tons of bookeeping exponentials), given the angle independent 
+	terms from `setup_thermal_1d`. 
+
+	Parameters
+	----------
+	u1 : float 
+		Cosine of the observer angle of this facet 
+	dtau : ndarray of float
+		Opacity per layer, Dimensions=# layer by # wave
+	exptrm_angle : ndarray of float 
+		exp(-dtau/u1), attenuation of each layer along the outgoing angle 
+
+	Returns
+	-------
+	thermal flux at the top of the atmosphere for this facet (nwno)
+	"""
+	nlayer = nlevel - 1
+	twopi = pi+pi
+
+	#only the upward flux at the midpoint of the top layer is needed, so the 
+	#flux through the rest of the layers is carried up in a single row 
+	flux_plus = twopi * (b_surface + b1[-1,:] * u1)
+
+	for ibot in range(nlayer-1, 0, -1):
+		for w in range(nwno):
+			ea = exptrm_angle[ibot,w]
+			flux_plus[w]=(flux_plus[w]*ea+
+			             (G[ibot,w]/(lamda[ibot,w]*u1-1.0))*(exptrm_positive[ibot,w]*ea-1.0)+
+			             (H[ibot,w]/(lamda[ibot,w]*u1+1.0))*(1.0-exptrm_minus[ibot,w]*ea)+
+			             alpha1[ibot,w]*(1.-ea)+
+			             alpha2[ibot,w]*(u1-(dtau[ibot,w]+u1)*ea) )
+
+	flux_at_top = zeros(nwno)
+	for w in range(nwno):
+		ea_mdpt = exp( -0.5 * dtau[0,w] / u1) 
+		flux_at_top[w]=(flux_plus[w]*ea_mdpt+
+		               (G[0,w]/(lamda[0,w]*u1-1.0))*(exptrm_positive[0,w]*ea_mdpt-exptrm_positive_mdpt[w])-
+		               (H[0,w]/(lamda[0,w]*u1+1.0))*(exptrm_minus[0,w]*ea_mdpt-exptrm_minus_mdpt[w])+
+		               alpha1[0,w]*(1.-ea_mdpt)+
+		               alpha2[0,w]*(u1+0.5*dtau[0,w]-(dtau[0,w]+u1)*ea_mdpt)  )
+
+	return flux_at_top
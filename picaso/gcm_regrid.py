@@ -0,0 +1,229 @@
+from functools import lru_cache
+from picaso import disco, io_utils
+import numpy as np
+
+@lru_cache(maxsize=256)
+def _get_facet_weights(lat, lon, ng, nt, phase_angle, quadrature, substellar_longitude):
+	"""
+	Memoized part of `get_facet_weights`, with the GCM grid passed as tuples so it can be hashed
+	"""
+	lat = np.array(lat)
+	lon = np.array(lon)
+	nlat, nlon = len(lat), len(lon)
+	geom = disco.get_geometry(ng, nt, phase_angle, quadrature)
+
+	#disco latitude is the colatitude and the star sits at disco longitude = phase angle
+	facet_lat = 90.0 - np.degrees(geom.latitude)
+	facet_lon = np.degrees(geom.longitude - phase_angle) + substellar_longitude
+
+	#latitude : linear between neighbouring rows, the poles take the closest row
+	if nlat > 1:
+		i = np.clip(np.searchsorted(lat, facet_lat) - 1, 0, nlat-2)
+		wlat = np.clip((facet_lat - lat[i]) / (lat[i+1] - lat[i]), 0, 1)
+	else:
+		i = np.zeros(nt, dtype=int)
+		wlat = np.zeros(nt)
+
+	#longitude : periodic, so wrap around onto [lon[0], lon[0]+360)
+	facet_lon = lon[0] + np.mod(facet_lon - lon[0], 360.0)
+	j = np.clip(np.searchsorted(lon, facet_lon, side='right') - 1, 0, nlon-1)
+	j1 = np.mod(j+1, nlon)
+	span = np.mod(lon[j1] - lon[j], 360.0)
+	wlon = np.divide(facet_lon - lon[j], span, out=np.zeros(ng), where=span>0)
+
+	#four corners of every (ng, nt) facet, indexing the flattened (nlat*nlon) grid
+	i1 = np.minimum(i+1, nlat-1)
+	index = np.stack([np.add.outer(j, i*nlon), np.add.outer(j1, i*nlon),
+			np.add.outer(j, i1*nlon), np.add.outer(j1, i1*nlon)], axis=-1)
+	weights = np.stack([np.outer(1-wlon, 1-wlat), np.outer(wlon, 1-wlat),
+			np.outer(1-wlon, wlat), np.outer(wlon, wlat)], axis=-1)
+	return index, weights
+
+def get_facet_weights(lat, lon, ng, nt, phase_angle, quadrature='gauss_chebyshev', substellar_longitude=0):
+	"""
+	Computes the bilinear interpolation weights that map a GCM latitude/longitude grid onto the
+	disco ball facets. This is memoized on the GCM grid and the geometry, so remapping the same
+	GCM to many phases (or many GCM outputs on the same grid) only computes the weights once per
+	phase.
+
+	Parameters
+	----------
+	lat : array
+		GCM latitudes (degrees, -90 to 90) in increasing order
+	lon : array
+		GCM longitudes (degrees) in increasing order, spanning less than 360
+	ng : int
+		Number of gauss angles
+	nt : int
+		Number of tchebyshev angles
+	phase_angle : float
+		Planetary phase angle (radians)
+	quadrature : str
+		(Optional) Disk integration scheme, must match the one given to `inputs.phase_angle`
+		(see `disco.quadratures`)
+	substellar_longitude : float
+		(Optional) Default = 0, GCM longitude (degrees) that faces the star. The planet is
+		assumed to be tidally locked, so at phase 0 the observer sees this longitude at the
+		center of the disk
+
+	Returns
+	-------
+	ndarray, ndarray
+		(ng, nt, 4) indices into the flattened (nlat*nlon) GCM grid and their (ng, nt, 4) weights.
+		These are shared by every caller with the same inputs so they should not be modified in place.
+	"""
+	lat = tuple(np.asarray(lat, dtype=float))
+	lon = tuple(np.asarray(lon, dtype=float))
+	if np.any(np.diff(lat) <= 0) or np.any(np.diff(lon) <= 0):
+		raise Exception("GCM latitudes and longitudes must be in increasing order")
+	return _get_facet_weights(lat, lon, ng, nt, float(phase_angle), quadrature, float(substellar_longitude))
+
+def get_facet_columns(lat, lon, ng, nt, phase_angle, quadrature='gauss_chebyshev', substellar_longitude=0):
+	"""
+	Finds the GCM column closest to each disco ball facet, so that anything computed per GCM 
+	column (e.g. optical properties) can be put straight on the facets without interpolating. 
+	Uses the same (memoized) weights as `get_facet_weights`. 
+
+	Parameters
+	----------
+	lat : array
+		GCM latitudes (degrees, -90 to 90) in increasing order
+	lon : array
+		GCM longitudes (degrees) in increasing order
+	ng : int
+		Number of gauss angles
+	nt : int
+		Number of tchebyshev angles
+	phase_angle : float
+		Planetary phase angle (radians)
+	quadrature : str
+		(Optional) Disk integration scheme (see `disco.quadratures`)
+	substellar_longitude : float
+		(Optional) Default = 0, GCM longitude (degrees) that faces the star
+
+	Returns
+	-------
+	ndarray
+		(ng, nt) index into the flattened (nlat*nlon) GCM grid, the same order as `get_gcm_columns`
+	"""
+	index, weights = get_facet_weights(lat, lon, ng, nt, phase_angle, quadrature=quadrature,
+		substellar_longitude=substellar_longitude)
+	return np.take_along_axis(index, np.argmax(weights, axis=-1)[...,np.newaxis], axis=-1)[...,0]
+
+def get_gcm_columns(gcm, lat, lon):
+	"""
+	Stacks a GCM lat/lon/pressure cube into one array of columns.
+
+	Parameters
+	----------
+	gcm : dict
+		Every column of the 3d input (e.g. pressure, temperature, H2O..) with values that are
+		(nlat, nlon, nlevel), or (nlevel) for columns that are the same everywhere
+	lat : array
+		GCM latitudes
+	lon : array
+		GCM longitudes
+
+	Returns
+	-------
+	ndarray, list
+		(nlat*nlon, nlevel, ncol) values of each GCM column, and the name of each column
+	"""
+	nlat, nlon = len(lat), len(lon)
+	header = list(gcm.keys())
+	nlevel = np.shape(gcm[header[0]])[-1]
+	columns = np.stack([np.broadcast_to(np.asarray(gcm[i], dtype=float), (nlat, nlon, nlevel))
+			for i in header], axis=-1).reshape(nlat*nlon, nlevel, len(header))
+	return columns, header
+
+def regrid_gcm(gcm, lat, lon, ng, nt, phase_angle, quadrature='gauss_chebyshev', substellar_longitude=0):
+	"""
+	Maps a GCM lat/lon/pressure cube onto the disco ball facets for one phase angle.
+
+	Parameters
+	----------
+	gcm : dict
+		Every column of the 3d input (e.g. pressure, temperature, H2O..) with values that are
+		(nlat, nlon, nlevel). Columns that are the same everywhere (e.g. the pressure grid) can
+		also be given as (nlevel). Pressure must be in bars.
+	lat : array
+		GCM latitudes (degrees, -90 to 90) in increasing order
+	lon : array
+		GCM longitudes (degrees) in increasing order
+	ng : int
+		Number of gauss angles
+	nt : int
+		Number of tchebyshev angles
+	phase_angle : float
+		Planetary phase angle (radians)
+	quadrature : str
+		(Optional) Disk integration scheme (see `disco.quadratures`)
+	substellar_longitude : float
+		(Optional) Default = 0, GCM longitude (degrees) that faces the star
+
+	Returns
+	-------
+	ndarray, list
+		(ng, nt, nlevel, ncol) values on the facets, and the name of each column. These can go
+		straight into `io_utils.write_3d_input`
+	"""
+	cube, header = get_gcm_columns(gcm, lat, lon)
+	nlevel = cube.shape[1]
+
+	index, weights = get_facet_weights(lat, lon, ng, nt, phase_angle, quadrature=quadrature,
+		substellar_longitude=substellar_longitude)
+
+	data = np.zeros((ng, nt, nlevel, len(header)))
+	for k in range(index.shape[-1]):
+		data += weights[:,:,k,np.newaxis,np.newaxis] * cube[index[:,:,k]]
+	return data, header
+
+def make_3d_gcm_input(ng, nt, phase_angle, gcm, lat, lon, output_file, quadrature='gauss_chebyshev',
+	substellar_longitude=0, compression=None):
+	"""
+	Program to create 3d PT input straight from GCM output, by interpolating the GCM onto the
+	disco ball (see `regrid_gcm`).
+
+	Parameters
+	----------
+	ng : int
+		Number of gauss angles
+	nt : int
+		Number of Tchebysehv angles
+	phase_angle : float
+		Geometry of phase angle
+	gcm : dict
+		Every column of the 3d input with values that are (nlat, nlon, nlevel), or (nlevel) for
+		columns that are the same everywhere. Must have `temperature`, `pressure` (bars), and at
+		least some molecular species (which are ALL case-sensitive)
+	lat : array
+		GCM latitudes (degrees, -90 to 90) in increasing order
+	lon : array
+		GCM longitudes (degrees) in increasing order
+	output_file : str
+		Output file location
+	quadrature : str
+		(Optional) Disk integration scheme, must match the one given to `inputs.phase_angle`
+		(see `disco.quadratures`)
+	substellar_longitude : float
+		(Optional) Default = 0, GCM longitude (degrees) that faces the star
+	compression : str
+		(Optional) h5py compression filter for the output (e.g. 'gzip' or 'lzf'). Default = None,
+		which is the fastest to write and read back
+
+	Returns
+	-------
+	Creates output file. No other returns.
+
+	Examples
+	--------
+	Phase curve inputs from one GCM output:
+
+	>>> for i, phase in enumerate(np.linspace(0, np.pi, 10)):
+	>>>     make_3d_gcm_input(10, 10, phase, gcm, lat, lon, 'gcm_phase%i.hdf5'%i)
+	"""
+	geom = disco.get_geometry(ng, nt, phase_angle, quadrature)
+	data, header = regrid_gcm(gcm, lat, lon, ng, nt, phase_angle, quadrature=quadrature,
+		substellar_longitude=substellar_longitude)
+	io_utils.write_3d_input(output_file, data, header, geom.gangle, geom.tangle,
+		compression=compression)
@@ -1,6 +1,8 @@
 import os 
 import json 
 import pandas as pd
+import numpy as np
+import h5py
 import warnings 
 
 def read_json(filename, **kwargs):
@@ -58,3 +60,120 @@ def read_hdf(filename, requires, raise_except=False, **kwargs):
     else: 
         d = pd.read_hdf(filename, hdf_name['table'].values[0])
     return d
+
+def write_3d_input(filename, data, header, gangle, tangle, compression=None):
+    """
+    write a 3d input (PT/chemistry or clouds) in the version 2 layout. Every facet 
+    is stored in one contiguous (ng, nt, nrow, ncol) dataset, along with the gauss 
+    and tchebyshev angles, so it can be read back in one go with `read_3d_input`.
+
+    Parameters
+    ----------
+    filename : str 
+        name of H5 file to write 
+    data : ndarray 
+        (ng, nt, nrow, ncol) values for every facet. For PT inputs the rows are levels, 
+        for cloud inputs they are layer x wavelength 
+    header : list of str 
+        name of each of the ncol columns (e.g. pressure, temperature, H2O..)
+    gangle : ndarray 
+        gauss angles of the disco ball 
+    tangle : ndarray 
+        tchebyshev angles of the disco ball
+    compression : str 
+        (Optional) h5py compression filter (e.g. 'gzip'). If given, the data is chunked 
+        one facet per chunk. Default = None, stored contiguous and uncompressed
+    """
+    data = np.asarray(data, dtype=float)
+    if data.shape[:2] != (len(gangle), len(tangle)): 
+        raise Exception("data must have dimensions (ng, nt, nrow, ncol)")
+    if data.shape[3] != len(header): 
+        raise Exception("header must name every column of data")
+
+    with h5py.File(filename, 'w') as h5db:
+        h5db.attrs['version'] = 2 
+        h5db.attrs['header'] = ','.join(header)
+        h5db.create_dataset('gangle', data=np.asarray(gangle, dtype=float))
+        h5db.create_dataset('tangle', data=np.asarray(tangle, dtype=float))
+        if compression is None:
+            h5db.create_dataset('data', data=data)
+        else: 
+            h5db.create_dataset('data', data=data, compression=compression, 
+                chunks=(1, 1)+data.shape[2:])
+
+def read_3d_input(filename):
+    """
+    read in a 3d input (PT/chemistry or clouds) written by `write_3d_input`. 
+    Files in the old layout, with one group per gauss angle and one dataset per 
+    tchebyshev angle named after the angles, are also read. Their facets are 
+    sorted by angle (gauss ascending and tchebyshev descending, like the disco 
+    ball) instead of the string order of the names.
+
+    Parameters
+    ----------
+    filename : str 
+        name of H5 file to read 
+
+    Returns
+    -------
+    data : ndarray 
+        (ng, nt, nrow, ncol) values for every facet 
+    header : list of str 
+        name of each column 
+    gangle : ndarray 
+        gauss angles 
+    tangle : ndarray 
+        tchebyshev angles 
+    """
+    with h5py.File(filename, 'r', swmr=True) as h5db:
+        header = h5db.attrs['header'].split(',')
+        if h5db.attrs.get('version', 1) >= 2:
+            data = h5db['data'][()]
+            gangle = h5db['gangle'][()]
+            tangle = h5db['tangle'][()]
+        else:
+            gkeys = sorted(h5db.keys(), key=float)
+            tkeys = sorted(h5db[gkeys[0]].keys(), key=float, reverse=True)
+            data = np.array([[h5db[g][t][()] for t in tkeys] for g in gkeys], dtype=float)
+            gangle = np.array(gkeys, dtype=float)
+            tangle = np.array(tkeys, dtype=float)
+    return data, header, gangle, tangle
+
+def read_3d_facet(filename, g, t):
+    """
+    read in a single facet of a 3d input (PT/chemistry or clouds), without loading the 
+    rest of the file. Facets are numbered the same way as `read_3d_input`. 
+
+    Parameters
+    ----------
+    filename : str 
+        name of H5 file to read 
+    g : int 
+        index of the gauss angle 
+    t : int 
+        index of the tchebyshev angle 
+
+    Returns
+    -------
+    data : ndarray 
+        (nrow, ncol) values of the facet
+    header : list of str 
+        name of each column 
+    gangle : ndarray 
+        gauss angles 
+    tangle : ndarray 
+        tchebyshev angles 
+    """
+    with h5py.File(filename, 'r', swmr=True) as h5db:
+        header = h5db.attrs['header'].split(',')
+        if h5db.attrs.get('version', 1) >= 2:
+            data = h5db['data'][g, t]
+            gangle = h5db['gangle'][()]
+            tangle = h5db['tangle'][()]
+        else:
+            gkeys = sorted(h5db.keys(), key=float)
+            tkeys = sorted(h5db[gkeys[0]].keys(), key=float, reverse=True)
+            data = np.array(h5db[gkeys[g]][tkeys[t]][()], dtype=float)
+            gangle = np.array(gkeys, dtype=float)
+            tangle = np.array(tkeys, dtype=float)
+    return data, header, gangle, tangle
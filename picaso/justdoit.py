@@ -1,20 +1,24 @@
 from .atmsetup import ATMSETUP
-from .fluxes import get_reflected_1d, get_reflected_3d , get_thermal_1d
+from .fluxes import get_reflected_1d, get_reflected_3d , get_thermal_1d, get_reflected_thermal_1d, get_thermal_3d, get_truncation_layer
 from .wavelength import get_cld_input_grid
+from .io_utils import read_3d_facet
+from . import gcm_regrid
 import numpy as np
 import pandas as pd
 from .optics import RetrieveOpacities,compute_opacity
 import os
 import pickle as pk
-from .disco import get_angles, compute_disco, compress_disco, compress_thermal
+from .disco import get_geometry, compress_disco, compress_thermal, mirror_disco, adapt_angles, quadratures
 import copy
 import json
+from joblib import Parallel, delayed
 import pysynphot as psyn
 import astropy.units as u
 import astropy.constants as c
 __refdata__ = os.environ.get('picaso_refdata')
 
-def picaso(bundle,opacityclass, dimension = '1d',calculation='reflected', full_output=False, plot_opacity= False):
+def picaso(bundle,opacityclass, dimension = '1d',calculation='reflected', full_output=False, plot_opacity= False,
+	chunk_size=None, n_cpu=1, stream=False, atmosphere=None):
 	"""
 	Currently top level program to run albedo code 
 
@@ -30,12 +34,41 @@ def picaso(bundle,opacityclass, dimension = '1d',calculation='reflected', full_o
 		plotting capabilities. 
 	plot_opacity : bool 
 		(Optional) Default = False, Creates pop up of the weighted opacity
+	chunk_size : int 
+		(Optional) Default = None, computes all wavenumbers at once. Otherwise, the wavenumber 
+		grid is computed chunk_size points at a time (opacities, optics, fluxes and disk integration) 
+		and the spectra are stitched together at the end. Wavenumbers are independent so the answer 
+		is the same, but peak memory is set by chunk_size instead of the size of the wave grid. 
+	n_cpu : int 
+		(Optional) Default = 1. For 3d, number of processes that the opacities and optical properties 
+		of the facets are computed on (see `get_optics_3d`). The answer doesn't depend on n_cpu. 
+	stream : bool 
+		(Optional) Default = False. For 3d, reads one facet at a time from the input files, computes 
+		its optics and intensity and adds it to the disk integral before moving on to the next one. 
+		Peak memory is then set by a single facet instead of the whole disco ball, at the cost of 
+		getting opacities facet by facet. Not available with full_output or n_cpu > 1. 
+	atmosphere : class ATMSETUP 
+		(Optional) Default = None, builds the atmosphere from the inputs. Otherwise a 1d atmosphere 
+		from `setup_atmosphere` to reuse (e.g. between retrieval steps). Changes made with its setters 
+		(`ATMSETUP.set_temperature`, `set_mixingratios`, `set_clouds`) are applied with 
+		`ATMSETUP.update`, so only what changed is recomputed. Not available with chunk_size. 
 
 	Return
 	------
 	Wavenumber, albedo if full_output=False 
 	Wavenumber, albedo, atmosphere if full_output = True 
 	"""
+	if chunk_size is not None:
+		if full_output:
+			raise Exception("full_output is not available when running with chunk_size")
+		if atmosphere is not None:
+			raise Exception("atmosphere is not available when running with chunk_size")
+		chunks = [picaso(bundle, opacityclass.get_chunk(i, i+chunk_size), dimension=dimension, 
+					calculation=calculation, plot_opacity=plot_opacity, n_cpu=n_cpu, stream=stream) 
+						for i in range(0, opacityclass.nwno, chunk_size)]
+		#every output is a wavenumber dependent array, so just stitch them back together
+		return tuple(np.concatenate(i) for i in zip(*chunks))
+
 	inputs = bundle.inputs
 
 	wno = opacityclass.wno
@@ -64,11 +97,21 @@ def picaso(bundle,opacityclass, dimension = '1d',calculation='reflected', full_o
 	#get geometry
 	ng = inputs['disco']['num_gangle']
 	nt = inputs['disco']['num_tangle']
+	quadrature = inputs['disco'].get('quadrature', 'gauss_chebyshev')
+	tolerance = inputs['disco'].get('tolerance', None)
+	if (tolerance is not None) & (dimension == '3d'):
+		raise Exception("Adaptive disco ball (tolerance) is only available for 1d calculations, 3d facets are set by the input file")
+	if (tolerance is not None) & ('reflected' not in calculation):
+		raise Exception("Adaptive disco ball (tolerance) converges the reflected albedo, so it needs 'reflected' in calculation. Set tolerance=None and pick num_gangle and num_tangle for thermal only calculations")
+	if stream & ((dimension != '3d') | full_output | (n_cpu > 1)):
+		raise Exception("stream is only available for 3d calculations without full_output and with n_cpu=1")
+	if (atmosphere is not None) & (dimension != '1d'):
+		raise Exception("Reusing an atmosphere is only available for 1d calculations")
 
-	gangle,gweight,tangle,tweight = get_angles(ng, nt) 
 	#planet disk is divided into gaussian and chebyshev angles and weights for perfoming the 
 	#intensity as a function of planetary pahse angle 
-	ubar0, ubar1, cos_theta,lat,lon = compute_disco(ng, nt, gangle, tangle, phase_angle)
+	geom = get_geometry(ng, nt, phase_angle, quadrature)
+	ubar0, ubar1, cos_theta = geom.ubar0, geom.ubar1, geom.cos_theta
 
 	#set star 
 	radius_star = inputs['star']['radius']
@@ -76,8 +119,241 @@ def picaso(bundle,opacityclass, dimension = '1d',calculation='reflected', full_o
 
 	#define approximinations 
 	delta_eddington = inputs['approx']['delta_eddington']
+	truncate_tau = inputs['approx'].get('truncate_tau', None)
+
+	#begin atm setup (streamed facets are set up one at a time)
+	if atmosphere is not None:
+		#only redo what changed since the last run
+		atm = atmosphere
+		atm.update(opacityclass)
+	elif not stream:
+		atm = setup_atmosphere(inputs, opacityclass, dimension=dimension)
+
+	if stream:
+		#only one facet is ever held in memory. Each one is run through the 1d calculation 
+		#with its own angles and added straight to the disk integral
+		albedo = np.zeros(nwno)
+		thermal = np.zeros(nwno)
+		for g in range(ng):
+			for t in range(nt):
+				atm = setup_atmosphere(get_facet_inputs(inputs, g, t), opacityclass, dimension='1d')
+				DTAU, TAU, W0, COSB,ftau_cld, ftau_ray,GCOS2, DTAU_OG, TAU_OG, W0_OG, COSB_OG= compute_opacity(
+					atm, opacityclass,delta_eddington=delta_eddington,test_mode=test_mode,raman=raman_approx)
+
+				ubar0_facet = np.ascontiguousarray(ubar0[g:g+1,t:t+1])
+				ubar1_facet = np.ascontiguousarray(ubar1[g:g+1,t:t+1])
+				weights_facet = np.ascontiguousarray(geom.weights[g:g+1,t:t+1])
+
+				nlevel = atm.c.nlevel
+				surf_reflect = atm.surf_reflect
+				if (truncate_tau is not None) & ('thermal' not in calculation):
+					nlayer_keep = get_truncation_layer(DTAU, TAU, W0, COSB, truncate_tau)
+					DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray, DTAU_OG, TAU_OG, W0_OG, COSB_OG = truncate_optics(
+						atm.c.nlayer, nlayer_keep, (DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray, DTAU_OG, TAU_OG, W0_OG, COSB_OG))
+					nlevel = nlayer_keep + 1
+					if nlayer_keep < atm.c.nlayer:
+						surf_reflect = 0*surf_reflect
+
+				if ('reflected' in calculation) & ('thermal' in calculation):
+					xint_at_top, flux_at_top  = get_reflected_thermal_1d(nlevel, wno,nwno,1,1,
+													DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray,
+													DTAU_OG, TAU_OG, W0_OG, COSB_OG ,
+													surf_reflect, ubar0_facet,ubar1_facet,cos_theta, F0PI,
+													single_phase,multi_phase,
+													frac_a,frac_b,frac_c,constant_back,constant_forward,
+													atm.level['temperature'], atm.level['pressure'])
+				elif 'reflected' in calculation:
+					xint_at_top  = get_reflected_1d(nlevel, wno,nwno,1,1,
+													DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray,
+													DTAU_OG, TAU_OG, W0_OG, COSB_OG ,
+													surf_reflect, ubar0_facet,ubar1_facet,cos_theta, F0PI,
+													single_phase,multi_phase,
+													frac_a,frac_b,frac_c,constant_back,constant_forward)
+				elif 'thermal' in calculation:
+					flux_at_top  = get_thermal_1d(nlevel, wno,nwno,1,1,atm.level['temperature'],
+													DTAU_OG, W0_OG, COSB_OG, atm.level['pressure'],ubar1_facet)
+
+				#the disk integral is a weighted sum over facets, so it can be built up one at a time
+				if 'reflected' in calculation:
+					albedo += compress_disco(nwno, cos_theta, xint_at_top, weights_facet, F0PI)
+				if 'thermal' in calculation:
+					thermal += compress_thermal(nwno, ubar1_facet, flux_at_top, weights_facet)
+
+	elif dimension == '1d':
+		#only need to get opacities for one pt profile
+
+		#There are two sets of dtau,tau,w0,g in the event that the user chooses to use delta-eddington
+		#We use HG function for single scattering which gets the forward scattering/back scattering peaks 
+		#well. We only really want to use delta-edd for multi scattering legendre polynomials. 
+		DTAU, TAU, W0, COSB,ftau_cld, ftau_ray,GCOS2, DTAU_OG, TAU_OG, W0_OG, COSB_OG= compute_opacity(
+			atm, opacityclass,delta_eddington=delta_eddington,test_mode=test_mode,raman=raman_approx,
+			full_output=full_output, plot_opacity=plot_opacity)
+
+		#reflected light can optionally skip the layers that are too deep to be seen
+		nlevel = atm.c.nlevel
+		surf_reflect = atm.surf_reflect
+		if (truncate_tau is not None) & ('thermal' not in calculation):
+			nlayer_keep = get_truncation_layer(DTAU, TAU, W0, COSB, truncate_tau)
+			DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray, DTAU_OG, TAU_OG, W0_OG, COSB_OG = truncate_optics(
+				atm.c.nlayer, nlayer_keep, (DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray, DTAU_OG, TAU_OG, W0_OG, COSB_OG))
+			nlevel = nlayer_keep + 1
+			if nlayer_keep < atm.c.nlayer:
+				#nothing reaches the bottom of the last layer, so it is treated as black 
+				surf_reflect = 0*surf_reflect
+
+		#optics don't depend on the disco ball so the number of angles can be picked 
+		#from the reflected albedo now 
+		solved = {}
+		if tolerance is not None:
+			def albedo(ng, nt):
+				geom = get_geometry(ng, nt, phase_angle, quadrature)
+				xint_at_top  = get_reflected_1d(nlevel, wno,nwno,ng,geom.nt_unique,
+													DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray,
+													DTAU_OG, TAU_OG, W0_OG, COSB_OG ,
+													surf_reflect, 
+													np.ascontiguousarray(geom.ubar0[:,:geom.nt_unique]),
+													np.ascontiguousarray(geom.ubar1[:,:geom.nt_unique]),
+													geom.cos_theta, F0PI,
+													single_phase,multi_phase,
+													frac_a,frac_b,frac_c,constant_back,constant_forward)
+				solved[(ng, nt)] = mirror_disco(xint_at_top, nt)
+				return compress_disco(nwno, geom.cos_theta, solved[(ng, nt)], geom.weights,F0PI)
+			ng, nt, _ = adapt_angles(albedo, ng, nt, tolerance, inputs['disco'].get('max_angles', 30))
+			geom = get_geometry(ng, nt, phase_angle, quadrature)
+			ubar0, ubar1, cos_theta = geom.ubar0, geom.ubar1, geom.cos_theta
+
+		#for a 1d atmosphere the disco ball is symmetric about the equator, so only 
+		#the unique tchebyshev angles are computed and then mirrored 
+		nt_unique = geom.nt_unique
+		ubar0_unique = np.ascontiguousarray(ubar0[:,:nt_unique])
+		ubar1_unique = np.ascontiguousarray(ubar1[:,:nt_unique])
+
+		if ('reflected' in calculation) & ('thermal' in calculation) & ((ng, nt) not in solved):
+			#compute both in one pass over the disco ball so the shared work is only done once
+			xint_at_top, flux_at_top  = get_reflected_thermal_1d(atm.c.nlevel, wno,nwno,ng,nt_unique,
+													DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray,
+													DTAU_OG, TAU_OG, W0_OG, COSB_OG ,
+													atm.surf_reflect, ubar0_unique,ubar1_unique,cos_theta, F0PI,
+													single_phase,multi_phase,
+													frac_a,frac_b,frac_c,constant_back,constant_forward,
+													atm.level['temperature'], atm.level['pressure'])
+			xint_at_top = mirror_disco(xint_at_top, nt)
+			flux_at_top = mirror_disco(flux_at_top, nt)
+		elif (ng, nt) in solved: 
+			#reflected light was already computed while picking the number of angles
+			xint_at_top = solved[(ng, nt)]
+			if 'thermal' in calculation:
+				flux_at_top  = get_thermal_1d(atm.c.nlevel, wno,nwno,ng,nt_unique,atm.level['temperature'],
+													DTAU_OG, W0_OG, COSB_OG, atm.level['pressure'],ubar1_unique)
+				flux_at_top = mirror_disco(flux_at_top, nt)
+		elif  'reflected' in calculation:
+			#use toon method (and tridiagonal matrix solver) to get net cumulative fluxes 
+			xint_at_top  = get_reflected_1d(nlevel, wno,nwno,ng,nt_unique,
+													DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray,
+													DTAU_OG, TAU_OG, W0_OG, COSB_OG ,
+													surf_reflect, ubar0_unique,ubar1_unique,cos_theta, F0PI,
+													single_phase,multi_phase,
+													frac_a,frac_b,frac_c,constant_back,constant_forward)
+			xint_at_top = mirror_disco(xint_at_top, nt)
+		elif 'thermal' in calculation:
+			#use toon method (and tridiagonal matrix solver) to get net cumulative fluxes 
+			flux_at_top  = get_thermal_1d(atm.c.nlevel, wno,nwno,ng,nt_unique,atm.level['temperature'],
+													DTAU_OG, W0_OG, COSB_OG, atm.level['pressure'],ubar1_unique)
+			flux_at_top = mirror_disco(flux_at_top, nt)
+			
+	elif dimension == '3d':
+
+		#get opacities for every unique column in one go. These come back column-major 
+		#(ncolumn, nlayer, nwno) and each facet gets a copy of its column, so each facet is a 
+		#contiguous block for the flux calculation
+		optics_3d = get_optics_3d(atm.columns, opacityclass,delta_eddington=delta_eddington,test_mode=test_mode,
+			raman=raman_approx, n_cpu=n_cpu)
+		(DTAU_3d, TAU_3d, W0_3d, COSB_3d,FTAU_CLD_3d,FTAU_RAY_3d,GCOS2_3d, 
+			DTAU_OG_3d, TAU_OG_3d, W0_OG_3d, COSB_OG_3d) = [np.ascontiguousarray(i[atm.facet_index]) for i in optics_3d]
+
+		#reflected light can optionally skip the layers that are too deep to be seen on any facet
+		nlevel = atm.c.nlevel
+		surf_reflect = atm.surf_reflect
+		if (truncate_tau is not None) & ('thermal' not in calculation):
+			nlayer_keep = max([get_truncation_layer(DTAU_3d[g,t], TAU_3d[g,t], W0_3d[g,t], COSB_3d[g,t], truncate_tau) 
+								for g in range(ng) for t in range(nt)])
+			(DTAU_3d, TAU_3d, W0_3d, COSB_3d,GCOS2_3d, FTAU_CLD_3d,FTAU_RAY_3d,
+				DTAU_OG_3d, TAU_OG_3d, W0_OG_3d, COSB_OG_3d) = truncate_optics(atm.c.nlayer, nlayer_keep, 
+					(DTAU_3d, TAU_3d, W0_3d, COSB_3d,GCOS2_3d, FTAU_CLD_3d,FTAU_RAY_3d,
+					DTAU_OG_3d, TAU_OG_3d, W0_OG_3d, COSB_OG_3d))
+			nlevel = nlayer_keep + 1
+			if nlayer_keep < atm.c.nlayer:
+				surf_reflect = 0*surf_reflect
+
+		if 'reflected' in calculation:
+			#use toon method (and tridiagonal matrix solver) to get net cumulative fluxes 
+			xint_at_top  = get_reflected_3d(nlevel, wno,nwno,ng,nt,
+												DTAU_3d, TAU_3d, W0_3d, COSB_3d,GCOS2_3d, FTAU_CLD_3d,FTAU_RAY_3d,
+												DTAU_OG_3d, TAU_OG_3d, W0_OG_3d, COSB_OG_3d,
+												surf_reflect, ubar0,ubar1,cos_theta, F0PI,
+												single_phase,multi_phase,
+												frac_a,frac_b,frac_c,constant_back,constant_forward)
+		if 'thermal' in calculation:
+			#level temperatures and pressures are stored (nlevel, ng, nt), make them facet-major
+			TLEVEL_3d = np.ascontiguousarray(np.transpose(atm.level['temperature'], (1,2,0)))
+			PLEVEL_3d = np.ascontiguousarray(np.transpose(atm.level['pressure'], (1,2,0)))
+			flux_at_top = get_thermal_3d(atm.c.nlevel, wno,nwno,ng,nt,TLEVEL_3d,
+												DTAU_OG_3d, W0_OG_3d, COSB_OG_3d, PLEVEL_3d,ubar1)
+
+	#now compress everything based on the weights (streamed facets are already compressed)
+	if  ('reflected' in calculation) & ('thermal' not in calculation):
+		if not stream:
+			albedo = compress_disco(nwno, cos_theta, xint_at_top, geom.weights,F0PI)
+		returns = (wno, albedo)
+
+	elif ('reflected' not in calculation) & ('thermal' in calculation):
+		if not stream:
+			thermal = compress_thermal(nwno,ubar1, flux_at_top, geom.weights)
+		fpfs_thermal = thermal/(opacityclass.unshifted_stellar_spec)*(atm.planet.radius/radius_star)**2.0
+		returns = wno,fpfs_thermal,thermal
+
+	elif ('reflected' in calculation) & ('thermal' in calculation):
+		if not stream:
+			albedo = compress_disco(nwno, cos_theta, xint_at_top, geom.weights,F0PI)
+			thermal = compress_thermal(nwno,ubar1,flux_at_top, geom.weights)
+		fpfs_thermal = thermal/(opacityclass.unshifted_stellar_spec)*(atm.planet.radius/radius_star)**2.0
+		returns = wno,albedo, fpfs_thermal,thermal
+
+	if full_output:	
+		#add full solution and latitude and longitudes to the full output
+		#atm.flux_at_top = flux_at_top
+		atm.xint_at_top = xint_at_top
+		atm.latitude = geom.latitude
+		atm.longitude = geom.longitude
+		return wno, albedo , atm.as_dict()
+	else: 
+		return returns
+
+def setup_atmosphere(inputs, opacityclass, dimension='1d', columns=None):
+	"""
+	Builds the atmosphere class from the user inputs and grabs the opacities needed 
+	for it. This is everything that has to happen before `compute_opacity`.
+
+	Parameters
+	----------
+	inputs : dict 
+		This is the input dict built by `justdoit.inputs` (e.g. `bundle.inputs`)
+	opacityclass : class picaso.RetrieveOpacities
+		Opacity class from `opannection`
+	dimension : str 
+		(Optional) Dimensions of the calculation. Default = '1d'. But '3d' is also accepted. 
+	columns : tuple 
+		(Optional) For 3d, (data, header) columns to use instead of the 3d input file 
+		(see `ATMSETUP.get_profile_3d`)
+
+	Returns
+	-------
+	ATMSETUP 
+		Atmosphere class with profile, clouds and opacities ready for `compute_opacity`
+	"""
+	wno = opacityclass.wno
+	nwno = opacityclass.nwno
 
-	#begin atm setup
 	atm = ATMSETUP(inputs)
 
 	################ From here on out is everything that would go through retrieval or 3d input##############
@@ -87,7 +363,7 @@ def picaso(bundle,opacityclass, dimension = '1d',calculation='reflected', full_o
 	if dimension == '1d':
 		atm.get_profile()
 	elif dimension == '3d':
-		atm.get_profile_3d()
+		atm.get_profile_3d(columns=columns)
 
 	#now can get these 
 	atm.get_mmw()
@@ -109,108 +385,351 @@ def picaso(bundle,opacityclass, dimension = '1d',calculation='reflected', full_o
 	atm.molecules = np.array([ x for x in atm.molecules if x not in no_opacities ])
 
 	#lastly grab needed opacities for the problem
+	if dimension == '3d':
+		#facets with the same column only need their opacities once. They are grabbed 
+		#along with the optical properties in `get_optics_3d`
+		atm.get_unique_facets()
+	else:
+		opacityclass.get_opacities(atm)
+
+	return atm
+
+def get_facet_inputs(inputs, g, t):
+	"""
+	Inputs for a 1d calculation of a single facet of a 3d atmosphere. Only that facet is read 
+	from the 3d PT and cloud files (see `io_utils.read_3d_facet`). 
+
+	Parameters
+	----------
+	inputs : dict 
+		This is the input dict built by `justdoit.inputs`, set up for a 3d calculation 
+	g : int 
+		Index of the gauss angle 
+	t : int 
+		Index of the tchebyshev angle 
+
+	Returns
+	-------
+	dict 
+		Copy of the inputs with the facet's PT profile and clouds as 1d dataframes
+	"""
+	ng = inputs['disco']['num_gangle']
+	nt = inputs['disco']['num_tangle']
+	facet = copy.copy(inputs)
+
+	data, header, gangle, tangle = read_3d_facet(inputs['atmosphere']['profile']['filepath'], g, t)
+	if (len(gangle) != ng) or (len(tangle) != nt): 
+		raise Exception("3d input has %i gauss and %i tchebyshev angles but %i and %i were requested in phase_angle" 
+			% (len(gangle), len(tangle), ng, nt))
+	facet['atmosphere'] = dict(inputs['atmosphere'], profile=pd.DataFrame(data, columns=header))
+
+	#same test as `ATMSETUP.get_clouds` for whether there are 3d clouds
+	if inputs['clouds']['wavenumber'] is not None:
+		cld, cld_header, cld_gangle, cld_tangle = read_3d_facet(inputs['clouds']['filepath'], g, t)
+		if (not np.allclose(cld_gangle, gangle)) or (not np.allclose(cld_tangle, tangle)):
+			raise Exception("Cloud input file is not on the same grid as the input PT/Angles profile")
+		facet['clouds'] = dict(inputs['clouds'], profile=pd.DataFrame(cld, columns=cld_header))
+	else: 
+		facet['clouds'] = dict(inputs['clouds'], profile=None)
+	return facet
+
+def get_optics_3d(atm, opacityclass, delta_eddington=True, test_mode=None, raman=0, n_cpu=1):
+	"""
+	Opacities and optical properties for every column of a 3d atmosphere (see `compute_opacity`). 
+	With n_cpu > 1 the columns are split into batches that run on a pool of processes. Each 
+	process opens its own connection to the opacity database, and the batches are put back 
+	together in order so the answer doesn't depend on n_cpu. 
+
+	Parameters
+	----------
+	atm : class ATMSETUP 
+		3d atmosphere, with the facets stored as (ncolumn x 1) (see `ATMSETUP.get_unique_facets`)
+	opacityclass : class picaso.RetrieveOpacities
+		Opacity class from `opannection`
+	delta_eddington : bool 
+		(Optional) Default = True, see `compute_opacity`
+	test_mode : str 
+		(Optional) Default = None, see `compute_opacity`
+	raman : int 
+		(Optional) Default = 0, see `compute_opacity`
+	n_cpu : int 
+		(Optional) Default = 1, Number of processes 
+
+	Returns
+	-------
+	list of ndarray 
+		Same as `compute_opacity`, each with dimensions (ncolumn, nlayer or nlevel, nwno)
+	"""
+	ncolumn = np.shape(atm.layer['temperature'])[1]
+	batches = [i for i in np.array_split(np.arange(ncolumn), n_cpu) if len(i) > 0]
+	if len(batches) == 1: 
+		return get_optics_batch(atm, opacityclass, delta_eddington=delta_eddington, 
+			test_mode=test_mode, raman=raman)
+
+	#workers retrieve their own opacities, so don't send the ones that are already loaded
+	opacityclass = copy.copy(opacityclass)
+	opacityclass.molecular_opa, opacityclass.continuum_opa = {}, {}
+	opacityclass.opacity_atmosphere = None
+	optics = Parallel(n_jobs=n_cpu)(delayed(get_optics_batch)(atm.take_facets(i, 0*i), opacityclass, 
+				delta_eddington=delta_eddington, test_mode=test_mode, raman=raman) for i in batches)
+	return [np.concatenate(i) for i in zip(*optics)]
+
+def get_optics_batch(atm, opacityclass, delta_eddington=True, test_mode=None, raman=0):
+	"""
+	Retrieves the opacities of a batch of 3d columns and computes their optical properties 
+	(see `get_optics_3d`). This is the work done by each process. 
+	"""
 	opacityclass.get_opacities(atm)
+	return compute_opacity(atm, opacityclass, delta_eddington=delta_eddington, test_mode=test_mode, raman=raman)
 
-	if dimension == '1d':
-		#only need to get opacities for one pt profile
+def phase_curve(bundle, opacityclass, phases, n_cpu=1):
+	"""
+	Computes a reflected light phase curve for a 1d atmosphere. In 1d the opacities and 
+	optical properties do not depend on phase angle, so the atmosphere and `compute_opacity` 
+	are done once and only the geometry and the flux calculation are repeated for each phase. 
 
-		#There are two sets of dtau,tau,w0,g in the event that the user chooses to use delta-eddington
-		#We use HG function for single scattering which gets the forward scattering/back scattering peaks 
-		#well. We only really want to use delta-edd for multi scattering legendre polynomials. 
-		DTAU, TAU, W0, COSB,ftau_cld, ftau_ray,GCOS2, DTAU_OG, TAU_OG, W0_OG, COSB_OG= compute_opacity(
-			atm, opacityclass,delta_eddington=delta_eddington,test_mode=test_mode,raman=raman_approx,
-			full_output=full_output, plot_opacity=plot_opacity)
+	Parameters
+	----------
+	bundle : dict 
+		This input dict is built by loading the input = `justdoit.load_inputs()` 
+	opacityclass : class picaso.RetrieveOpacities
+		Opacity class from `opannection`
+	phases : array of float 
+		Phase angles in radians 
+	n_cpu : int 
+		(Optional) Default = 1. Number of threads to run the phases on. 
+
+	Returns
+	-------
+	Wavenumber, albedo with dimensions (nphase, nwno)
+	"""
+	inputs = bundle.inputs
 
-		if  'reflected' in calculation:
-			#use toon method (and tridiagonal matrix solver) to get net cumulative fluxes 
-			xint_at_top  = get_reflected_1d(atm.c.nlevel, wno,nwno,ng,nt,
-													DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray,
-													DTAU_OG, TAU_OG, W0_OG, COSB_OG ,
-													atm.surf_reflect, ubar0,ubar1,cos_theta, F0PI,
-													single_phase,multi_phase,
-													frac_a,frac_b,frac_c,constant_back,constant_forward)
-		if 'thermal' in calculation:
-			#use toon method (and tridiagonal matrix solver) to get net cumulative fluxes 
-			flux_at_top  = get_thermal_1d(atm.c.nlevel, wno,nwno,ng,nt,atm.level['temperature'],
-													DTAU_OG, W0_OG, COSB_OG, atm.level['pressure'],ubar1)
-			
-	elif dimension == '3d':
+	wno = opacityclass.wno
+	nwno = opacityclass.nwno
 
-		#setup zero array to fill with opacities
-		TAU_3d = np.zeros((atm.c.nlevel, nwno, ng, nt))
-		DTAU_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		W0_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		COSB_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		GCOS2_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		FTAU_CLD_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		FTAU_RAY_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		#these are the unchanged values from delta-eddington
-		TAU_OG_3d = np.zeros((atm.c.nlevel, nwno, ng, nt))
-		DTAU_OG_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		W0_OG_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-		COSB_OG_3d = np.zeros((atm.c.nlayer, nwno, ng, nt))
-
-		#get opacities at each facet
-		for g in range(ng):
-			for t in range(nt): 
+	#set approx numbers options (to be used in numba compiled functions)
+	single_phase = inputs['approx']['single_phase']
+	multi_phase = inputs['approx']['multi_phase']
+	raman_approx =inputs['approx']['raman']
+	delta_eddington = inputs['approx']['delta_eddington']
+	test_mode = inputs['test_mode']
+
+	#parameters needed for the two term hg phase function. 
+	f = inputs['approx']['TTHG_params']['fraction']
+	frac_a = f[0]
+	frac_b = f[1]
+	frac_c = f[2]
+	constant_back = inputs['approx']['TTHG_params']['constant_back']
+	constant_forward = inputs['approx']['TTHG_params']['constant_forward']
+
+	ng = inputs['disco']['num_gangle']
+	nt = inputs['disco']['num_tangle']
+	quadrature = inputs['disco'].get('quadrature', 'gauss_chebyshev')
+	tolerance = inputs['disco'].get('tolerance', None)
+
+	F0PI = np.zeros(nwno) + 1.0 
+
+	#atmosphere and optics are only computed once for all phases 
+	atm = setup_atmosphere(inputs, opacityclass, dimension='1d')
+	DTAU, TAU, W0, COSB,ftau_cld, ftau_ray,GCOS2, DTAU_OG, TAU_OG, W0_OG, COSB_OG= compute_opacity(
+		atm, opacityclass,delta_eddington=delta_eddington,test_mode=test_mode,raman=raman_approx)
+
+	#deep layers that can't be seen don't depend on phase either
+	nlevel = atm.c.nlevel
+	surf_reflect = atm.surf_reflect
+	truncate_tau = inputs['approx'].get('truncate_tau', None)
+	if truncate_tau is not None:
+		nlayer_keep = get_truncation_layer(DTAU, TAU, W0, COSB, truncate_tau)
+		DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray, DTAU_OG, TAU_OG, W0_OG, COSB_OG = truncate_optics(
+			atm.c.nlayer, nlayer_keep, (DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray, DTAU_OG, TAU_OG, W0_OG, COSB_OG))
+		nlevel = nlayer_keep + 1
+		if nlayer_keep < atm.c.nlayer:
+			surf_reflect = 0*surf_reflect
+
+	def albedo(phase_angle, ng, nt):
+		geom = get_geometry(ng, nt, phase_angle, quadrature)
+		ubar0, ubar1, cos_theta, nt_unique = geom.ubar0, geom.ubar1, geom.cos_theta, geom.nt_unique
+		xint_at_top  = get_reflected_1d(nlevel, wno,nwno,ng,nt_unique,
+												DTAU, TAU, W0, COSB,GCOS2,ftau_cld,ftau_ray,
+												DTAU_OG, TAU_OG, W0_OG, COSB_OG ,
+												surf_reflect, 
+												np.ascontiguousarray(ubar0[:,:nt_unique]),
+												np.ascontiguousarray(ubar1[:,:nt_unique]),
+												cos_theta, F0PI,
+												single_phase,multi_phase,
+												frac_a,frac_b,frac_c,constant_back,constant_forward)
+		xint_at_top = mirror_disco(xint_at_top, nt)
+		return compress_disco(nwno, cos_theta, xint_at_top, geom.weights,F0PI)
+
+	def albedo_at_phase(phase_angle):
+		if tolerance is None: 
+			return albedo(phase_angle, ng, nt)
+		#crescent phases need more angles than full phase so each phase gets its own
+		return adapt_angles(lambda ng, nt: albedo(phase_angle, ng, nt), ng, nt, tolerance, 
+						inputs['disco'].get('max_angles', 30))[2]
+
+	#get_reflected_1d releases the GIL so the phases can run on threads 
+	#without copying the optical properties to other processes
+	if n_cpu == 1:
+		albedo = [albedo_at_phase(phase) for phase in phases]
+	else:
+		albedo = Parallel(n_jobs=n_cpu, backend='threading')(
+					delayed(albedo_at_phase)(phase) for phase in phases)
+
+	return wno, np.array(albedo)
+
+def phase_curve_3d(bundle, opacityclass, phases, gcm, lat, lon, calculation='reflected', 
+	substellar_longitude=0, n_cpu=1):
+	"""
+	Computes a phase curve for a 3d atmosphere straight from GCM output. The opacities and 
+	optical properties of every (unique) GCM column are computed once. For each phase, every 
+	facet takes the optical properties of its closest GCM column (see 
+	`gcm_regrid.get_facet_columns`), so only the geometry and the flux calculation are 
+	repeated. Clouds are not included. 
+
+	Parameters
+	----------
+	bundle : dict 
+		This input dict is built by loading the input = `justdoit.load_inputs()` 
+	opacityclass : class picaso.RetrieveOpacities
+		Opacity class from `opannection`
+	phases : array of float 
+		Phase angles in radians 
+	gcm : dict
+		Every column of the 3d input with values that are (nlat, nlon, nlevel), or (nlevel) for
+		columns that are the same everywhere (see `gcm_regrid.regrid_gcm`)
+	lat : array
+		GCM latitudes (degrees, -90 to 90) in increasing order
+	lon : array
+		GCM longitudes (degrees) in increasing order
+	calculation : str 
+		(Optional) Default = 'reflected'. Can also be 'thermal' or 'reflected+thermal'
+	substellar_longitude : float
+		(Optional) Default = 0, GCM longitude (degrees) that faces the star
+	n_cpu : int 
+		(Optional) Default = 1. Number of processes the optical properties of the GCM 
+		columns are computed on (see `get_optics_3d`)
+
+	Returns
+	-------
+	Same as `picaso` with dimension='3d', with every spectrum (nphase, nwno)
+	"""
+	inputs = bundle.inputs
 
-				#edit atm class to only have subsection of 3d stuff 
-				atm_1d = copy.deepcopy(atm)
+	wno = opacityclass.wno
+	nwno = opacityclass.nwno
 
-				#diesct just a subsection to get the opacity 
-				atm_1d.disect(g,t)
+	#set approx numbers options (to be used in numba compiled functions)
+	single_phase = inputs['approx']['single_phase']
+	multi_phase = inputs['approx']['multi_phase']
+	raman_approx =inputs['approx']['raman']
+	delta_eddington = inputs['approx']['delta_eddington']
+	test_mode = inputs['test_mode']
 
-				dtau, tau, w0, cosb,ftau_cld, ftau_ray, gcos2, DTAU_OG, TAU_OG, W0_OG, COSB_OG = compute_opacity(
-					atm_1d, opacityclass,delta_eddington=delta_eddington,test_mode=test_mode,raman=raman_approx)
+	#parameters needed for the two term hg phase function. 
+	f = inputs['approx']['TTHG_params']['fraction']
+	frac_a = f[0]
+	frac_b = f[1]
+	frac_c = f[2]
+	constant_back = inputs['approx']['TTHG_params']['constant_back']
+	constant_forward = inputs['approx']['TTHG_params']['constant_forward']
 
-				DTAU_3d[:,:,g,t] = dtau
-				TAU_3d[:,:,g,t] = tau
-				W0_3d[:,:,g,t] = w0 
-				COSB_3d[:,:,g,t] = cosb
-				GCOS2_3d[:,:,g,t]= gcos2 
-				FTAU_CLD_3d[:,:,g,t]= ftau_cld
-				FTAU_RAY_3d[:,:,g,t]= ftau_ray
-				#these are the unchanged values from delta-eddington
-				TAU_OG_3d[:,:,g,t] = TAU_OG
-				DTAU_OG_3d[:,:,g,t] = DTAU_OG
-				W0_OG_3d[:,:,g,t] = W0_OG
-				COSB_OG_3d[:,:,g,t] = COSB_OG
+	ng = inputs['disco']['num_gangle']
+	nt = inputs['disco']['num_tangle']
+	quadrature = inputs['disco'].get('quadrature', 'gauss_chebyshev')
+	if inputs['clouds']['wavenumber'] is not None:
+		raise Exception("Clouds are not available for GCM phase curves")
 
+	radius_star = inputs['star']['radius']
+	F0PI = np.zeros(nwno) + 1.0 
 
+	#atmosphere and optics are only computed once for every GCM column 
+	atm = setup_atmosphere(inputs, opacityclass, dimension='3d', 
+		columns=gcm_regrid.get_gcm_columns(gcm, lat, lon))
+	optics = get_optics_3d(atm.columns, opacityclass, delta_eddington=delta_eddington, 
+		test_mode=test_mode, raman=raman_approx, n_cpu=n_cpu)
+	#unique column of each GCM column 
+	column_index = atm.facet_index[:,0]
+
+	#deep layers that can't be seen by any column don't depend on phase either
+	nlevel = atm.c.nlevel
+	surf_reflect = atm.surf_reflect
+	truncate_tau = inputs['approx'].get('truncate_tau', None)
+	if (truncate_tau is not None) & ('thermal' not in calculation):
+		nlayer_keep = max([get_truncation_layer(optics[0][i], optics[1][i], optics[2][i], optics[3][i], truncate_tau) 
+							for i in range(len(optics[0]))])
+		optics = truncate_optics(atm.c.nlayer, nlayer_keep, optics)
+		nlevel = nlayer_keep + 1
+		if nlayer_keep < atm.c.nlayer:
+			surf_reflect = 0*surf_reflect
+
+	#level temperatures and pressures of the unique columns, (ncolumn, nlevel)
+	tlevel = np.ascontiguousarray(atm.columns.level['temperature'][:,:,0].T)
+	plevel = np.ascontiguousarray(atm.columns.level['pressure'][:,:,0].T)
+
+	albedo, thermal = [], []
+	for phase_angle in phases:
+		geom = get_geometry(ng, nt, phase_angle, quadrature)
+		facets = column_index[gcm_regrid.get_facet_columns(lat, lon, ng, nt, phase_angle, 
+			quadrature=quadrature, substellar_longitude=substellar_longitude)]
+		(DTAU_3d, TAU_3d, W0_3d, COSB_3d,FTAU_CLD_3d,FTAU_RAY_3d,GCOS2_3d, 
+			DTAU_OG_3d, TAU_OG_3d, W0_OG_3d, COSB_OG_3d) = [np.ascontiguousarray(i[facets]) for i in optics]
+
+		if 'reflected' in calculation:
+			xint_at_top  = get_reflected_3d(nlevel, wno,nwno,ng,nt,
+												DTAU_3d, TAU_3d, W0_3d, COSB_3d,GCOS2_3d, FTAU_CLD_3d,FTAU_RAY_3d,
+												DTAU_OG_3d, TAU_OG_3d, W0_OG_3d, COSB_OG_3d,
+												surf_reflect, geom.ubar0,geom.ubar1,geom.cos_theta, F0PI,
+												single_phase,multi_phase,
+												frac_a,frac_b,frac_c,constant_back,constant_forward)
+			albedo += [compress_disco(nwno, geom.cos_theta, xint_at_top, geom.weights,F0PI)]
+		if 'thermal' in calculation:
+			flux_at_top = get_thermal_3d(atm.c.nlevel, wno,nwno,ng,nt,tlevel[facets],
+												DTAU_OG_3d, W0_OG_3d, COSB_OG_3d, plevel[facets],geom.ubar1)
+			thermal += [compress_thermal(nwno,geom.ubar1, flux_at_top, geom.weights)]
 
-		#use toon method (and tridiagonal matrix solver) to get net cumulative fluxes 
-		xint_at_top  = get_reflected_3d(atm.c.nlevel, wno,nwno,ng,nt,
-											DTAU_3d, TAU_3d, W0_3d, COSB_3d,GCOS2_3d, FTAU_CLD_3d,FTAU_RAY_3d,
-											DTAU_OG_3d, TAU_OG_3d, W0_OG_3d, COSB_OG_3d,
-											atm.surf_reflect, ubar0,ubar1,cos_theta, F0PI,
-											single_phase,multi_phase,
-											frac_a,frac_b,frac_c,constant_back,constant_forward)
+	albedo, thermal = np.array(albedo), np.array(thermal)
+	if 'thermal' in calculation:
+		fpfs_thermal = thermal/(opacityclass.unshifted_stellar_spec)*(atm.planet.radius/radius_star)**2.0
 
-	#now compress everything based on the weights 
 	if  ('reflected' in calculation) & ('thermal' not in calculation):
-		albedo = compress_disco(nwno, cos_theta, xint_at_top, gweight, tweight,F0PI)
-		returns = (wno, albedo)
-
+		return wno, albedo
 	elif ('reflected' not in calculation) & ('thermal' in calculation):
-		thermal = compress_thermal(nwno,ubar1, flux_at_top, gweight, tweight)
-		fpfs_thermal = thermal/(opacityclass.unshifted_stellar_spec)*(atm.planet.radius/radius_star)**2.0
-		returns = wno,fpfs_thermal,thermal
+		return wno, fpfs_thermal, thermal
+	else:
+		return wno, albedo, fpfs_thermal, thermal
 
-	elif ('reflected' in calculation) & ('thermal' in calculation):
-		albedo = compress_disco(nwno, cos_theta, xint_at_top, gweight, tweight,F0PI)
-		thermal = compress_thermal(nwno,ubar1,flux_at_top, gweight, tweight)
-		fpfs_thermal = thermal/(opacityclass.unshifted_stellar_spec)*(atm.planet.radius/radius_star)**2.0
-		returns = wno,albedo, fpfs_thermal,thermal
+def truncate_optics(nlayer, nlayer_keep, optics):
+	"""
+	Keeps only the top `nlayer_keep` layers of the optical properties returned by 
+	`compute_opacity` (or their facet-major 3d stacks). Level quantities (e.g. TAU) keep 
+	one extra row for the bottom of the last layer. Scalars (e.g. from test_mode) are 
+	returned as they are. 
 
-	if full_output:	
-		#add full solution and latitude and longitudes to the full output
-		#atm.flux_at_top = flux_at_top
-		atm.xint_at_top = xint_at_top
-		atm.latitude = lat
-		atm.longitude = lon
-		return wno, albedo , atm.as_dict()
-	else: 
-		return returns
+	Parameters
+	----------
+	nlayer : int 
+		Number of layers in the full atmosphere 
+	nlayer_keep : int 
+		Number of layers to keep (see `fluxes.get_truncation_layer`)
+	optics : tuple 
+		Optical properties with layers (or levels) on the second to last axis 
+
+	Returns
+	-------
+	list 
+		Truncated optical properties, in the same order. Arrays are C-contiguous so the 
+		flux kernels get the same signature `precompile.warmup` compiles 
+	"""
+	truncated = []
+	for i in optics: 
+		if np.ndim(i) < 2: 
+			truncated += [i]
+		else:
+			#levels have one more row than layers. The 3d facet stacks slice to strided views 
+			truncated += [np.ascontiguousarray(i[...,:nlayer_keep + i.shape[-2] - nlayer,:])]
+	return truncated
 
 def opannection(filename_db = None, raman_db = None):
 	"""
@@ -272,7 +791,8 @@ class inputs():
 		#			)
 
 
-	def phase_angle(self, phase=0,num_gangle=10, num_tangle=10):
+	def phase_angle(self, phase=0,num_gangle=10, num_tangle=10, tolerance=None, max_angles=30,
+		quadrature='gauss_chebyshev'):
 		"""Define phase angle and number of gauss and tchebychev angles to compute. 
 		
 		phase : float,int
@@ -282,11 +802,30 @@ class inputs():
 			 Higher numbers will slow down code. 
 		num_tangle : int 
 			Number of Tchebyshev angles to integrate over facets (default is 10)
+		tolerance : float 
+			(Optional) Default = None, uses num_gangle and num_tangle as they are. Otherwise, 
+			the number of angles is picked for each calculation so that the reflected albedo is 
+			converged to within this absolute tolerance (see `disco.adapt_angles`). 
+			num_gangle and num_tangle are then the starting point, so they should be small (e.g. 4). 
+			Only for 1d calculations that include reflected light. For 'reflected+thermal' the 
+			angles are picked on the reflected albedo alone and the thermal flux uses the same ones. 
+		max_angles : int 
+			(Optional) Default = 30, Maximum number of gauss or tchebyshev angles that 
+			tolerance can refine to.
+		quadrature : str 
+			(Optional) Default = 'gauss_chebyshev', Scheme used to integrate over the disk 
+			(see `disco.quadratures`). 'gauss_legendre' reaches the same accuracy with far 
+			fewer angles (see `disco.get_angles_legendre`).
 		"""
 		if (num_gangle < 2 ) or (num_tangle < 2 ): raise Exception("length of gangle and tangle must be > than 2")
 		self.inputs['phase_angle'] = phase
 		self.inputs['disco']['num_gangle'] = int(num_gangle)
 		self.inputs['disco']['num_tangle'] = int(num_tangle)
+		self.inputs['disco']['tolerance'] = tolerance
+		self.inputs['disco']['max_angles'] = int(max_angles)
+		if quadrature not in quadratures: 
+			raise Exception("quadrature must be one of: "+", ".join(quadratures.keys()))
+		self.inputs['disco']['quadrature'] = quadrature
 
 	def gravity(self, gravity=None, gravity_unit=None, 
 		              radius=None, radius_unit=None, 
@@ -606,7 +1145,7 @@ class inputs():
 			self.inputs['clouds']['profile'] = df
 
 	def approx(self,single_phase='TTHG_ray',multi_phase='N=2',delta_eddington=True,raman='oklopcic',
-				tthg_frac=[1,-1,2], tthg_back=-0.5, tthg_forward=1):
+				tthg_frac=[1,-1,2], tthg_back=-0.5, tthg_forward=1, truncate_tau=None):
 		"""
 		This function sets all the default approximations in the code. It transforms the string specificatons
 		into a number so that they can be used in numba nopython routines. 
@@ -630,6 +1169,10 @@ class inputs():
 			Back scattering asymmetry factor gf = g_bar*tthg_back
 		tthg_forward : float 
 			Forward scattering asymmetry factor gb = g_bar * tthg_forward 
+		truncate_tau : float 
+			(Optional) Default = None. Reflected light only. Layers below where the direct beam and the 
+			diffuse field have both reached this optical depth at every wavelength (e.g. 35) are 
+			left out of the calculation. 
 		"""
 
 		self.inputs['approx']['single_phase'] = single_phase_options(printout=False).index(single_phase)
@@ -647,15 +1190,30 @@ class inputs():
 
 		self.inputs['approx']['TTHG_params']['constant_back'] = tthg_back
 		self.inputs['approx']['TTHG_params']['constant_forward']=tthg_forward
+		#always a float so the numba kernel only ever sees the signature warmup() compiles
+		self.inputs['approx']['truncate_tau'] = None if truncate_tau is None else float(truncate_tau)
 
 
-	def spectrum(self,opacityclass,dimension = '1d', calculation='reflected', full_output=False, plot_opacity= False):
+	def spectrum(self,opacityclass,dimension = '1d', calculation='reflected', full_output=False, plot_opacity= False,
+		chunk_size=None, n_cpu=1, stream=False, atmosphere=None):
 		"""Run Spectrum"""
 		if ('thermal' in calculation) and (np.isnan(self.inputs['star']['radius']) or np.isnan(self.inputs['planet']['radius'])):
 			raise Exception("Stellar or Planet radius not supplied but thermal flux was requested. See options in `star()` `gravity()`")
 			
 		return picaso(self, opacityclass,dimension=dimension,calculation=calculation,
-			full_output=full_output, plot_opacity=plot_opacity)
+			full_output=full_output, plot_opacity=plot_opacity, chunk_size=chunk_size, n_cpu=n_cpu, 
+			stream=stream, atmosphere=atmosphere)
+
+
+	def phase_curve(self, opacityclass, phases, n_cpu=1):
+		"""Run reflected light phase curve for a 1d atmosphere (see `justdoit.phase_curve`)"""
+		return phase_curve(self, opacityclass, phases, n_cpu=n_cpu)
+
+	def phase_curve_3d(self, opacityclass, phases, gcm, lat, lon, calculation='reflected', 
+		substellar_longitude=0, n_cpu=1):
+		"""Run phase curve for a 3d atmosphere from GCM output (see `justdoit.phase_curve_3d`)"""
+		return phase_curve_3d(self, opacityclass, phases, gcm, lat, lon, calculation=calculation, 
+			substellar_longitude=substellar_longitude, n_cpu=n_cpu)
 
 
 def jupiter_pt():
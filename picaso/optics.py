@@ -9,12 +9,16 @@ from bokeh.palettes import inferno
 import io 
 import sqlite3
 import math
+import copy
 #@jit(nopython=True)
 def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=False,raman=0, plot_opacity=False,
 	full_output=False):
 	"""
 	Returns total optical depth per slab layer including molecular opacity, continuum opacity. 
 	It should automatically select the molecules needed
+
+	For a 3d atmosphere every facet is computed at once and everything returned has an extra 
+	leading facet dimension (ng*nt x # layer by # wavelength). 
 	
 	Parameters
 	----------
@@ -95,15 +99,34 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 	a better methodology)
 	"""
 	atm = atmosphere
-	tlevel = atm.level['temperature']
-	plevel = atm.level['pressure']/atm.c.pconv #think of a better solution for this later when mark responds
-	
-	tlayer = atm.layer['temperature']
-	player = atm.layer['pressure']/atm.c.pconv #think of a better solution for this later when mark responds
-	gravity = atm.planet.gravity / 100.0 #this too... need to have consistent units.
 	nlayer = atm.c.nlayer
 	nwno = opacityclass.nwno
 
+	if atm.dimension == '3d':
+		#the facets are flattened so layer quantities are (nlayer x nfacet) and opacities are 
+		#(nwno x nlayer x nfacet). Everything that is transposed below is then facet-major 
+		#(nfacet x nlayer x nwno), which is how the 3d flux calculations want it
+		facets = lambda x: x.reshape(x.shape[0], -1)
+		#numba functions work on a single column, so facets are stacked into one long column 
+		column = lambda x: np.ravel(x.T)
+		uncolumn = lambda x: x.reshape(-1, nlayer, nwno)
+		cloud = {i: np.moveaxis(atm.layer['cloud'][i], (2,3), (0,1)).reshape(-1, nlayer, nwno) 
+					for i in ['opd','g0','w0']}
+	else: 
+		facets = column = uncolumn = lambda x: x 
+		cloud = atm.layer['cloud']
+	mixingratios = {m: facets(atm.layer['mixingratios'][:,i]) for m,i in atm.species_index.items()}
+
+	tlevel = facets(atm.level['temperature'])
+	plevel = facets(atm.level['pressure'])/atm.c.pconv #think of a better solution for this later when mark responds
+	
+	tlayer = facets(atm.layer['temperature'])
+	player = facets(atm.layer['pressure'])/atm.c.pconv #think of a better solution for this later when mark responds
+	gravity = atm.planet.gravity / 100.0 #this too... need to have consistent units.
+	mmw = facets(atm.layer['mmw'])
+	colden = facets(atm.layer['colden'])
+	if 'electrons' in atm.layer.keys(): electrons = facets(atm.layer['electrons'])
+
 	if plot_opacity: 
 		plot_layer=int(nlayer/2)#np.size(tlayer)-1
 		opt_figure = figure(x_axis_label = 'Wavelength', y_axis_label='TAUGAS in optics.py', 
@@ -128,7 +151,7 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 	COEF1 = atm.c.rgas*273.15**2*.5E5* (
 		ACOEF* (plevel[1:]**2 - plevel[:-1]**2) + BCOEF*(
 			2./3.)*(plevel[1:]**3 - plevel[:-1]**3) ) / (
-		1.01325**2 *gravity*tlayer*atm.layer['mmw'])
+		1.01325**2 *gravity*tlayer*mmw)
 
 	#go through every molecule in the continuum first 
 	for m in atm.continuum_molecules:
@@ -136,9 +159,9 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 		#H- Bound-Free
 		if (m[0] == "H-") and (m[1] == "bf"):
 			ADDTAU = (opacityclass.continuum_opa['H-bf']*( 		     #[(nwno x nlayer) *(
-							atm.layer['mixingratios'][m[0]].values*	 #nlayer
-						   	atm.layer['colden']/ 					 #nlayer
-						   	(atm.layer['mmw']*atm.c.amu)) 	).T		 #nlayer)].T
+							mixingratios[m[0]]*	 #nlayer
+						   	colden/ 					 #nlayer
+						   	(mmw*atm.c.amu)) 	).T		 #nlayer)].T
 
 			TAUGAS += ADDTAU
 			if plot_opacity: opt_figure.line(1e4/opacityclass.wno, ADDTAU[plot_layer,:], alpha=0.7,legend=m[0]+m[1], line_width=3, color=colors[c],
@@ -147,10 +170,10 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 		#H- Free-Free
 		elif (m[0] == "H-") and (m[1] == "ff"):
 			ADDTAU = (opacityclass.continuum_opa['H-ff']*( 				                 #[(nwno x nlayer) *(
-							atm.layer['pressure']* 								  		 #nlayer
-							atm.layer['mixingratios']['H'].values*atm.layer['electrons']*#nlayer
-						   	atm.layer['colden']/ 										 #nlayer
-						   	(tlayer*atm.layer['mmw']*atm.c.amu*atm.c.k_b)) 	).T			 #nlayer)].T
+							facets(atm.layer['pressure'])* 								  		 #nlayer
+							mixingratios['H']*electrons*#nlayer
+						   	colden/ 										 #nlayer
+						   	(tlayer*mmw*atm.c.amu*atm.c.k_b)) 	).T			 #nlayer)].T
 			#testing['H-ff'] = ADDTAU
 			TAUGAS += ADDTAU
 			if plot_opacity: opt_figure.line(1e4/opacityclass.wno, ADDTAU[plot_layer,:], alpha=0.7,legend=m[0]+m[1], line_width=3, color=colors[c],
@@ -163,10 +186,10 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 			#multiplying each column of the opacities by the same 1D vector (as opposed to traditional 
 			#matrix multiplication). This is the reason for the transposes.
 			ADDTAU = (opacityclass.continuum_opa['H2-']*( 				#[(nwno x nlayer) *(
-							atm.layer['pressure']* 								  		#nlayer
-							atm.layer['mixingratios']['H2'].values*atm.layer['electrons']*	#nlayer
-						   	atm.layer['colden']/ 										#nlayer
-						   	(atm.layer['mmw']*atm.c.amu)) 	).T							#nlayer)].T
+							facets(atm.layer['pressure'])* 								  		#nlayer
+							mixingratios['H2']*electrons*	#nlayer
+						   	colden/ 										#nlayer
+						   	(mmw*atm.c.amu)) 	).T							#nlayer)].T
 
 
 			TAUGAS += ADDTAU
@@ -178,8 +201,8 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 			#calculate opacity
 			ADDTAU = (opacityclass.continuum_opa[m[0]+m[1]] * ( #[(nwno x nlayer) *(
 								COEF1*											#nlayer
-								atm.layer['mixingratios'][m[0]].values *				#nlayer
-								atm.layer['mixingratios'][m[1]].values )  ).T 			#nlayer)].T
+								mixingratios[m[0]] *				#nlayer
+								mixingratios[m[1]] )  ).T 			#nlayer)].T
 
 			TAUGAS += ADDTAU
 			if plot_opacity: opt_figure.line(1e4/opacityclass.wno, ADDTAU[plot_layer,:], alpha=0.7,legend=m[0]+m[1], line_width=3, color=colors[c],
@@ -190,9 +213,9 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 	for m in atm.molecules:
 		#ind = np.where(m==np.array(atm.weights.keys()))[0][0]
 		ADDTAU = (opacityclass.molecular_opa[m] * ( #[(nwno x nlayer) *(
-					atm.layer['colden']*
-					atm.layer['mixingratios'][m].values/ #removing this bc of opa unit change *atm.weights[m].values[0]/ 
-					atm.layer['mmw']) ).T 
+					colden*
+					mixingratios[m]/ #removing this bc of opa unit change *atm.weights[m].values[0]/ 
+					mmw) ).T 
 		TAUGAS += ADDTAU
 		#testing[m] = ADDTAU
 		if plot_opacity: opt_figure.line(1e4/opacityclass.wno, ADDTAU[plot_layer,:], alpha=0.7,legend=m, line_width=3, color=colors[c],
@@ -200,13 +223,13 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 		c+=1
 
 	#====================== ADD RAYLEIGH OPACITY======================	
-	ray_mixingratios = np.zeros((nlayer,3))#hardwired because we only have h2,he and ch4 scattering
+	ray_mixingratios = np.zeros((np.size(tlayer),3))#hardwired because we only have h2,he and ch4 scattering
 	for i,j in zip(['H2','He','CH4'],range(3)):
 		if i in atm.rayleigh_molecules:
-			ray_mixingratios[:,j] = atm.layer['mixingratios'][i].values
+			ray_mixingratios[:,j] = column(mixingratios[i])
 
-	TAURAY = rayleigh(atm.layer['colden'],ray_mixingratios, 
-					opacityclass.wave, atm.layer['mmw'],atm.c.amu )
+	TAURAY = uncolumn(rayleigh(column(colden),ray_mixingratios, 
+					opacityclass.wave, column(mmw),atm.c.amu ))
 
 	if plot_opacity: opt_figure.line(1e4/opacityclass.wno, TAURAY[plot_layer,:], alpha=0.7,legend='Rayleigh', line_width=3, color=colors[c],
 			muted_color=colors[c], muted_alpha=0.2)	
@@ -216,15 +239,15 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 	raman_db = opacityclass.raman_db
 	#OKLOPCIC OPACITY
 	if raman == 0 :
-		raman_factor = compute_raman(nwno, nlayer,opacityclass.wno, 
-			opacityclass.raman_stellar_shifts, tlayer, raman_db['c'].values,
-				raman_db['ji'].values, raman_db['deltanu'].values)
+		raman_factor = uncolumn(compute_raman(nwno, np.size(tlayer),opacityclass.wno, 
+			opacityclass.raman_stellar_shifts, column(tlayer), raman_db['c'].values,
+				raman_db['ji'].values, raman_db['deltanu'].values))
 		if plot_opacity: opt_figure.line(1e4/opacityclass.wno, raman_factor[plot_layer,:]*TAURAY[plot_layer,:], alpha=0.7,legend='Shifted Raman', line_width=3, color=colors[c],
 				muted_color=colors[c], muted_alpha=0.2)
 		raman_factor = np.minimum(raman_factor, raman_factor*0+0.99999)
 	#POLLACK OPACITY
 	elif raman ==1: 
-		raman_factor = raman_pollack(nlayer)
+		raman_factor = raman_pollack(nlayer)[:,opacityclass.wno_slice]
 		raman_factor = np.minimum(raman_factor, raman_factor*0+0.99999)		
 		if plot_opacity: opt_figure.line(1e4/opacityclass.wno, raman_factor[plot_layer,:]*TAURAY[plot_layer,:], alpha=0.7,legend='Shifted Raman', line_width=3, color=colors[c],
 				muted_color=colors[c], muted_alpha=0.2)
@@ -234,9 +257,9 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 	
 
 	#====================== ADD CLOUD OPACITY======================	
-	TAUCLD = atm.layer['cloud']['opd'] #TAUCLD is the total extinction from cloud = (abs + scattering)
-	asym_factor_cld = atm.layer['cloud']['g0'] 
-	single_scattering_cld = atm.layer['cloud']['w0'] 
+	TAUCLD = cloud['opd'] #TAUCLD is the total extinction from cloud = (abs + scattering)
+	asym_factor_cld = cloud['g0'] 
+	single_scattering_cld = cloud['w0'] 
 
 	#====================== If user requests full output, add Tau's to atmosphere class=====
 	if full_output:
@@ -265,8 +288,8 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 
 	#sum up taus starting at the top, going to depth
 	shape = DTAU.shape
-	TAU = np.zeros((shape[0]+1, shape[1]))
-	TAU[1:,:]=numba_cumsum(DTAU)
+	TAU = np.zeros(shape[:-2]+(shape[-2]+1, shape[-1]))
+	TAU[...,1:,:]=np.cumsum(DTAU, axis=-2)
 
 	if plot_opacity:
 		opt_figure.line(1e4/opacityclass.wno, DTAU[int(np.size(tlayer)/2),:], legend='TOTAL', line_width=4, color=colors[0],
@@ -309,8 +332,8 @@ def compute_opacity(atmosphere, opacityclass, delta_eddington=True,test_mode=Fal
 		dtau_dedd=DTAU*(1.-W0*COSB**2) 
 
 		#sum up taus starting at the top, going to depth
-		tau_dedd = np.zeros((shape[0]+1, shape[1]))
-		tau_dedd[1:,:]=numba_cumsum(dtau_dedd)
+		tau_dedd = np.zeros(shape[:-2]+(shape[-2]+1, shape[-1]))
+		tau_dedd[...,1:,:]=np.cumsum(dtau_dedd, axis=-2)
 	
 		#returning the terms used in 
 		return dtau_dedd, tau_dedd, w0_dedd, cosb_dedd ,ftau_cld, ftau_ray, GCOS2, \
@@ -630,6 +653,9 @@ class RetrieveOpacities():
 			self.db_connect = self.open_local
 
 		self.get_available_data()
+
+		#atmosphere whose opacities are currently held here, see `get_opacities`
+		self.opacity_atmosphere = None
 		
 		#raman cross sections 
 		self.raman_db = pd.read_csv(raman_data,
@@ -669,31 +695,64 @@ class RetrieveOpacities():
 		self.wno =  cur.fetchone()[0]
 		self.wave = 1e4/self.wno 
 		self.nwno = np.size(self.wno)
+		#points of the database wave grid that this class returns (see `get_chunk`)
+		self.wno_slice = slice(0, self.nwno)
 
 		conn.close()
 
-	def get_opacities(self,atmosphere):
-		"""
-		Get's opacities using the atmosphere class
+	def get_opacities(self,atmosphere, layers=None):
 		"""
-		#open connection 
-		cur, conn = self.db_connect()
+		Get's opacities using the atmosphere class. For a 3d atmosphere the layers of every 
+		facet are looked up together, so each unique PT point is only matched and queried once. 
+		The opacities are then (nwave x nlayer) in 1d and (nwave x nlayer x ng*nt) in 3d.
 
-		nlayer =atmosphere.c.nlayer
-		tlayer =atmosphere.layer['temperature']
-		player = atmosphere.layer['pressure']
+		Parameters
+		----------
+		atmosphere : class ATMSETUP 
+			Atmosphere to get the opacities for 
+		layers : array of int 
+			(Optional) Default = None, gets every layer. Otherwise only these layers (indices into 
+			the flattened layer arrays, i.e. layer numbers in 1d) are refreshed, as long as the 
+			opacities of the other layers were last retrieved here for the same atmosphere (see 
+			`ATMSETUP.update`) 
+		"""
+		tlayer =np.ravel(atmosphere.layer['temperature'])
+		player = np.ravel(atmosphere.layer['pressure'])
 		molecules = atmosphere.molecules
 		cia_molecules = atmosphere.continuum_molecules
+		nlayer =atmosphere.c.nlayer
+		shape = (self.nwno, nlayer) if np.ndim(atmosphere.layer['temperature']) == 1 else (self.nwno, nlayer, -1)
+
+		#only refresh the layers that changed if the rest are already there, which needs both 
+		#this class to hold this atmosphere and the atmosphere's last update to have been here
+		refresh = ((layers is not None) and (self.opacity_atmosphere is atmosphere)
+				and (atmosphere.opacity_class is self))
+		index = np.asarray(layers, dtype=int) if refresh else np.arange(tlayer.size)
+		if len(index) == 0:
+			return
+		tlayer, player = tlayer[index], player[index]
+		self.opacity_atmosphere = atmosphere
+		atmosphere.opacity_class = self
 
-		#struture opacity dictionary
-		self.molecular_opa = {key:np.zeros((self.nwno, nlayer)) for key in molecules}
-		self.continuum_opa = {key[0]+key[1]:np.zeros((self.nwno, nlayer)) for key in cia_molecules}
+		#open connection 
+		cur, conn = self.db_connect()
 
 		#this will make getting opacities faster 
-		#this is getting the ptid corresponding to the pairs
-		ind_pt=[min(self.pt_pairs, 
-			key=lambda c: math.hypot(c[1]- coordinate[0], c[2]-coordinate[1]))[0] 
-				for coordinate in  zip(player,tlayer)]
+		#this is getting the ptid corresponding to the pairs, only for the unique PT points 
+		pt, inverse = np.unique(np.array([player, tlayer]).T, axis=0, return_inverse=True)
+		#matched in blocks of points so the distance matrix stays small for big 3d atmospheres
+		pairs = np.array(self.pt_pairs)
+		closest = np.zeros(len(pt), dtype=int)
+		for i in range(0, len(pt), 1000):
+			block = pt[i:i+1000]
+			closest[i:i+1000] = np.argmin(np.hypot(pairs[:,1][np.newaxis,:] - block[:,0][:,np.newaxis], 
+							pairs[:,2][np.newaxis,:] - block[:,1][:,np.newaxis]), axis=1)
+		ptid = pairs[closest, 0].astype(int)
+		ind_pt = ptid[np.ravel(inverse)]
+		if refresh:
+			atmosphere.layer['pt_opa_index'].flat[index] = ind_pt
+		else:
+			atmosphere.layer['pt_opa_index'] = ind_pt.reshape(np.shape(atmosphere.layer['temperature']))
 
 		#query molecular opacities from sqlite3
 		if len(molecules) ==1: 
@@ -701,31 +760,40 @@ class RetrieveOpacities():
 		else:
 			query_mol = 'WHERE molecule in '+str(tuple(molecules) )
 
-		atmosphere.layer['pt_opa_index'] = ind_pt
+		unique_ptid = np.unique(ptid)
 		cur.execute("""SELECT molecule,ptid,opacity 
 		            FROM molecular 
 		            {} 
-		            AND ptid in {}""".format(query_mol, str(tuple(np.unique(ind_pt)))))
+		            AND ptid in ({})""".format(query_mol, ','.join(str(i) for i in unique_ptid)))
 		#fetch everything and stick into a dictionary where we can find the right
 		#pt and molecules
 		data= cur.fetchall()
 		data = dict((x+'_'+str(y), dat) for x,y,dat in data)		
 
 		#structure it into a dictionary e.g. {'H2O':ndarray(nwave x nlayer), 'CH4':ndarray(nwave x nlayer)}.. 
-		for i in self.molecular_opa.keys():
-			for j,ind in zip(ind_pt,range(nlayer)):
-				self.molecular_opa[i][:,ind] = data[i+'_'+str(j)]*6.02214086e+23 #add to opacity bundle
+		where = np.searchsorted(unique_ptid, ind_pt)
+		if not refresh: 
+			self.molecular_opa = {}
+		for i in molecules:
+			opa = np.array([data[i+'_'+str(j)][self.wno_slice] for j in unique_ptid])*6.02214086e+23 
+			if refresh:
+				#the arrays are contiguous so this writes straight into the refreshed layers
+				self.molecular_opa[i].reshape(self.nwno, -1)[:, index] = opa.T[:, where]
+			else:
+				self.molecular_opa[i] = np.ascontiguousarray(opa.T[:, where]).reshape(shape) #add to opacity bundle
 
 		#continuum
 		#find nearest temp for cia grid
-		tcia = [np.unique(self.cia_temps)[find_nearest(np.unique(self.cia_temps),i)] for i in tlayer]
+		cia_temps = np.unique(self.cia_temps)
+		unique_t, inverse = np.unique(tlayer, return_inverse=True)
+		tcia = cia_temps[[find_nearest(cia_temps,i) for i in unique_t]]
 
 		#if user only runs a single molecule or temperature
-		if len(tcia) ==1: 
+		if len(np.unique(tcia)) ==1: 
 			query_temp = """AND temperature= '{}' """.format(str(tcia[0]))
 		else:
-			query_temp = 'AND temperature in '+str(tuple(tcia) )
-		cia_mol = list(self.continuum_opa.keys())
+			query_temp = 'AND temperature in ({})'.format(','.join(str(i) for i in np.unique(tcia)))
+		cia_mol = [key[0]+key[1] for key in cia_molecules]
 		if len(cia_mol) ==1: 
 			query_mol = """WHERE molecule= '{}' """.format(str(cia_mol[0]))
 		else:
@@ -739,11 +807,47 @@ class RetrieveOpacities():
 		data = cur.fetchall()
 		data = dict((x+'_'+str(y), dat) for x, y,dat in data)
 
-		for i in self.continuum_opa.keys():
-		    for j,ind in zip(tcia,range(nlayer)):
-		        self.continuum_opa[i][:,ind] = data[i+'_'+str(j)]
+		if not refresh: 
+			self.continuum_opa = {}
+		for i in cia_mol:
+			opa = np.array([data[i+'_'+str(j)][self.wno_slice] for j in tcia])
+			if refresh:
+				self.continuum_opa[i].reshape(self.nwno, -1)[:, index] = opa.T[:, np.ravel(inverse)]
+			else:
+				self.continuum_opa[i] = np.ascontiguousarray(opa.T[:, np.ravel(inverse)]).reshape(shape)
 
 		conn.close()      
+
+	def get_chunk(self, start, stop):
+		"""
+		Returns a copy of the opacity class that only covers the wavenumber points [start:stop]. 
+		The database connection and everything that doesn't depend on wavenumber is shared. 
+		Opacities retrieved with `get_opacities` from the copy are only for this chunk. 
+
+		Parameters
+		----------
+		start : int 
+			First wavenumber point of the chunk 
+		stop : int 
+			Last wavenumber point of the chunk (not included)
+
+		Returns
+		-------
+		RetrieveOpacities
+		"""
+		stop = min(stop, self.nwno)
+		chunk = copy.copy(self)
+		chunk.opacity_atmosphere = None
+		chunk.wno_slice = slice(self.wno_slice.start + start, self.wno_slice.start + stop)
+		chunk.wno = self.wno[start:stop]
+		chunk.wave = self.wave[start:stop]
+		chunk.nwno = np.size(chunk.wno)
+		if hasattr(self, 'unshifted_stellar_spec'):
+			chunk.unshifted_stellar_spec = self.unshifted_stellar_spec[start:stop]
+		if hasattr(self, 'raman_stellar_shifts'):
+			chunk.raman_stellar_shifts = self.raman_stellar_shifts[start:stop,:]
+		return chunk
+
 	def get_continuum_opac(self, temperature, molecule): 
 		"""DISCONTINUED.
 		Based on a temperature, this retrieves the continuum opacity for 
@@ -0,0 +1,231 @@
+from . import fluxes, disco, optics
+import numpy as np
+import glob
+import os
+import time
+import sys
+
+def get_kernels(nlayer=4, nwno=5, ng=2, nt=2):
+	"""
+	Lists the numba kernels that `picaso()` calls, each with small dummy inputs that have the
+	same types that `picaso()` passes to them with the default approximations (see `approx()`).
+
+	Parameters
+	----------
+	nlayer : int
+		(Optional) Number of layers for the dummy inputs
+	nwno : int
+		(Optional) Number of wavenumbers for the dummy inputs
+	ng : int
+		(Optional) Number of gauss angles for the dummy inputs
+	nt : int
+		(Optional) Number of tchebychev angles for the dummy inputs
+
+	Returns
+	-------
+	list of (name, function, args)
+	"""
+	nlevel = nlayer + 1
+	wno = np.linspace(5000., 25000., nwno)
+	wave = 1e4/wno
+
+	#optical properties in the same (layer, wave) layout as compute_opacity returns
+	dtau = np.zeros((nlayer, nwno)) + 0.1
+	tau = np.zeros((nlevel, nwno))
+	tau[1:,:] = np.cumsum(dtau, axis=0)
+	w0 = np.zeros((nlayer, nwno)) + 0.5
+	cosb = np.zeros((nlayer, nwno)) + 0.1
+	gcos2 = np.zeros((nlayer, nwno)) + 0.25
+	ftau_cld = np.zeros((nlayer, nwno)) + 0.5
+	ftau_ray = np.zeros((nlayer, nwno)) + 0.5
+	one_d = (dtau, tau, w0, cosb, gcos2, ftau_cld, ftau_ray, dtau, tau, w0, cosb)
+	three_d = tuple(np.ascontiguousarray(np.broadcast_to(i, (ng, nt)+i.shape)) for i in one_d)
+
+	tlevel = np.linspace(500., 1500., nlevel)
+	plevel = np.logspace(-3, 2, nlevel)*1e6
+	tlevel_3d = np.ascontiguousarray(np.broadcast_to(tlevel, (ng, nt, nlevel)))
+	plevel_3d = np.ascontiguousarray(np.broadcast_to(plevel, (ng, nt, nlevel)))
+
+	surf_reflect = np.zeros(nwno)
+	F0PI = np.zeros(nwno) + 1.0
+
+	#geometry, without calling any kernels so they are all timed below 
+	gangle,gweight,tangle,tweight = disco.get_angles(ng, nt)
+	weights = np.outer(gweight, tweight)
+	ubar0 = np.zeros((ng, nt)) + 0.5
+	ubar1 = np.zeros((ng, nt)) + 0.5
+	cos_theta = np.cos(0.1)
+	xint_at_top = np.zeros((ng, nt, nwno)) + 0.1
+
+	#default approximations from config.json
+	single_phase, multi_phase = 3, 0
+	frac_a, frac_b, frac_c, constant_back, constant_forward = 1, -1, 2, -0.5, 1
+	phase_function = (single_phase, multi_phase, frac_a, frac_b, frac_c, constant_back, constant_forward)
+
+	#raman, with the column types of the raman database
+	nshift = 3
+	stellar_shifts = np.ones((nwno, nshift))
+	tlayer = 0.5*(tlevel[1:] + tlevel[:-1])
+	cross_sections = np.ones(nshift)
+	j_initial = np.arange(nshift, dtype=np.int64)
+	deltanu = np.linspace(100., 300., nshift)
+
+	colden = np.ones(nlayer)
+	mmw = np.zeros(nlayer) + 2.3
+	ray_mixingratios = np.zeros((nlayer,3)) + 0.3
+
+	return [
+		('get_reflected_1d', fluxes.get_reflected_1d,
+			(nlevel, wno, nwno, ng, nt) + one_d + (surf_reflect, ubar0, ubar1, cos_theta, F0PI) + phase_function),
+		('get_reflected_3d', fluxes.get_reflected_3d,
+			(nlevel, wno, nwno, ng, nt) + three_d + (surf_reflect, ubar0, ubar1, cos_theta, F0PI) + phase_function),
+		('get_reflected_thermal_1d', fluxes.get_reflected_thermal_1d,
+			(nlevel, wno, nwno, ng, nt) + one_d + (surf_reflect, ubar0, ubar1, cos_theta, F0PI)
+			+ phase_function + (tlevel, plevel)),
+		('get_thermal_1d', fluxes.get_thermal_1d,
+			(nlevel, wno, nwno, ng, nt, tlevel, dtau, w0, cosb, plevel, ubar1)),
+		('get_thermal_3d', fluxes.get_thermal_3d,
+			(nlevel, wno, nwno, ng, nt, tlevel_3d, three_d[0], three_d[2], three_d[3], plevel_3d, ubar1)),
+		('get_truncation_layer', fluxes.get_truncation_layer, (dtau, tau, w0, cosb, 35.0)),
+		('compute_disco', disco.compute_disco, (ng, nt, gangle, tangle, 0.1)),
+		('compress_disco', disco.compress_disco, (nwno, cos_theta, xint_at_top, weights, F0PI)),
+		('compress_thermal', disco.compress_thermal, (nwno, ubar1, xint_at_top, weights)),
+		('compute_raman', optics.compute_raman,
+			(nwno, nlayer, wno, stellar_shifts, tlayer, cross_sections, j_initial, deltanu)),
+		('rayleigh', optics.rayleigh, (colden, ray_mixingratios, wave, mmw, 1.66053904e-24)),
+		('bin_star', optics.bin_star, (wno, np.linspace(4000., 26000., 3*nwno), np.ones(3*nwno))),
+		('numba_cumsum', optics.numba_cumsum, (dtau,)),
+		('find_nearest', optics.find_nearest, (tlevel, 600.)),
+	]
+
+def is_cached(kernel):
+	"""
+	Checks whether the numba cache index for a kernel exists on disk
+
+	Parameters
+	----------
+	kernel : numba dispatcher
+		Function decorated with `@jit(cache=True)`
+
+	Returns
+	-------
+	bool
+	"""
+	name = kernel.py_func.__module__.split('.')[-1]+'.'+kernel.py_func.__name__
+	return len(glob.glob(os.path.join(kernel.stats.cache_path, name+'-*.nbi'))) > 0
+
+def warmup(verbose=True):
+	"""
+	Compiles all the numba kernels that `picaso()` uses for their standard signatures so
+	that they are written to the numba cache. Run this once when building an environment
+	(e.g. `python -m picaso.precompile`) and the first `picaso()` call loads the kernels
+	from the cache instead of compiling them.
+
+	Parameters
+	----------
+	verbose : bool
+		(Optional) Default = True, prints a table of the time spent on each kernel
+
+	Returns
+	-------
+	dict
+		For each kernel: seconds spent, whether it was loaded from the cache (as
+		opposed to compiled) and whether the cache is now populated. The time for a
+		kernel includes the kernels it calls, if they hadn't been compiled yet.
+	"""
+	report = {}
+	for name, kernel, args in get_kernels():
+		hits = sum(kernel.stats.cache_hits.values())
+		t0 = time.time()
+		kernel(*args)
+		seconds = time.time() - t0
+		report[name] = {'seconds': seconds,
+						'loaded': sum(kernel.stats.cache_hits.values()) > hits,
+						'cached': is_cached(kernel)}
+
+	if verbose:
+		print('{:<26}{:>10}{:>10}{:>8}'.format('kernel', 'seconds', 'source', 'cached'))
+		for name, i in report.items():
+			print('{:<26}{:>10.2f}{:>10}{:>8}'.format(name, i['seconds'],
+				'cache' if i['loaded'] else 'compiled', str(i['cached'])))
+		print('{:<26}{:>10.2f}'.format('total', sum(i['seconds'] for i in report.values())))
+	return report
+
+def benchmark_reflected_thermal(nlayer=60, nwno=3000, ng=10, nt=10, repeat=3, verbose=True):
+	"""
+	Times the fused `fluxes.get_reflected_thermal_1d` against calling `fluxes.get_reflected_1d` 
+	and `fluxes.get_thermal_1d` one after the other, which is what `picaso()` would otherwise 
+	do for a 'reflected+thermal' calculation. Both are run on `numba.get_num_threads()` 
+	threads (set with `NUMBA_NUM_THREADS` or `numba.set_num_threads`). 
+
+	Unlike the dummy inputs of `get_kernels`, the optical depth grows by 7 decades from the 
+	top to the bottom of the atmosphere and the single scattering albedo varies with 
+	wavenumber, so the exponentials and the tridiagonal solves cost what they do in practice. 
+
+	Parameters
+	----------
+	nlayer : int
+		(Optional) Number of layers 
+	nwno : int
+		(Optional) Number of wavenumbers 
+	ng : int
+		(Optional) Number of gauss angles 
+	nt : int
+		(Optional) Number of tchebychev angles 
+	repeat : int 
+		(Optional) Number of calls to time, the fastest is kept 
+	verbose : bool
+		(Optional) Default = True, prints the timings 
+
+	Returns
+	-------
+	dict
+		Fastest seconds for 'fused' and 'separate', and the number of 'threads'
+	"""
+	from numba import get_num_threads
+	nlevel = nlayer + 1
+	wno = np.linspace(5000., 25000., nwno)
+
+	dtau = np.outer(np.logspace(-5, 2, nlayer), 1 + 0.9*np.sin(wno/37.))
+	tau = np.zeros((nlevel, nwno))
+	tau[1:,:] = np.cumsum(dtau, axis=0)
+	w0 = np.outer(np.ones(nlayer), 0.5 + 0.45*np.cos(wno/53.))
+	cosb = np.zeros((nlayer, nwno)) + 0.1
+	gcos2 = np.zeros((nlayer, nwno)) + 0.25
+	ftau = np.zeros((nlayer, nwno)) + 0.5
+	tlevel = np.linspace(500., 1500., nlevel)
+	plevel = np.logspace(-3, 2, nlevel)*1e6
+
+	geom = disco.get_geometry(ng, nt, 0.3, 'gauss_chebyshev')
+	ubar0, ubar1 = np.ascontiguousarray(geom.ubar0), np.ascontiguousarray(geom.ubar1)
+	reflected = ((nlevel, wno, nwno, ng, nt, dtau, tau, w0, cosb, gcos2, ftau, ftau, dtau, tau, w0, cosb,
+				np.zeros(nwno), ubar0, ubar1, geom.cos_theta, np.ones(nwno), 3, 0, 1, -1, 2, -0.5, 1))
+
+	calls = {'fused': lambda: fluxes.get_reflected_thermal_1d(*reflected + (tlevel, plevel)),
+			'separate': lambda: (fluxes.get_reflected_1d(*reflected),
+				fluxes.get_thermal_1d(nlevel, wno, nwno, ng, nt, tlevel, dtau, w0, cosb, plevel, ubar1))}
+
+	report = {'threads': get_num_threads()}
+	for name, call in calls.items():
+		#first call compiles (or loads from the cache) 
+		call()
+		seconds = []
+		for i in range(repeat):
+			t0 = time.time()
+			call()
+			seconds += [time.time() - t0]
+		report[name] = min(seconds)
+
+	if verbose:
+		print('{} threads, {}x{} angles, {} layers, {} wavenumbers'.format(report['threads'], ng, nt, nlayer, nwno))
+		print('fused {:.2f}s, separate {:.2f}s'.format(report['fused'], report['separate']))
+	return report
+
+def main():
+	"""Command line entry point (`picaso-warmup` or `python -m picaso.precompile`)"""
+	report = warmup()
+	#non zero exit so image builds fail if the cache couldn't be written
+	sys.exit(0 if all(i['cached'] for i in report.values()) else 1)
+
+if __name__ == '__main__':
+	main()
@@ -3,7 +3,8 @@ import pandas as pd
 from bokeh.plotting import figure, show, output_file
 from bokeh.palettes import inferno
 import numpy as np
-from .justdoit import picaso 
+import astropy.units as u
+from .justdoit import picaso, inputs, opannection, setup_atmosphere, jupiter_pt 
 import os 
 
 __refdata__ = os.environ.get('picaso_refdata')
@@ -197,3 +198,58 @@ def madhu_test(rayleigh=True, isotropic=True, asymmetric=True, single_phase = 'T
 				wno, alb = picaso(a)
 				real_answer.loc[i,str(g)]=alb[-1] 
 	return real_answer
+
+
+def atmosphere_update_test(nsteps=6, seed=0):
+	"""
+	Tests that updating an atmosphere in place (`ATMSETUP.set_temperature` + `ATMSETUP.update`) 
+	gives the same opacities as building it from scratch with `setup_atmosphere`. The updates 
+	alternate between two opacity classes and a second atmosphere is set up in between, so 
+	the layers that are only refreshed selectively have to be tracked across all of them. 
+
+	Parameters
+	----------
+	nsteps : int 
+		Number of temperature updates to make 
+	seed : int 
+		Seed for the random layers and temperature changes 
+
+	Returns
+	-------
+	DataFrame of the max % deviation of the molecular and continuum opacities from a fresh 
+	`setup_atmosphere` after each update 
+	"""
+	rng = np.random.RandomState(seed)
+	opas = [opannection(), opannection()]
+	fresh = opannection()
+
+	case = inputs()
+	case.phase_angle(0)
+	case.gravity(gravity=25, gravity_unit=u.Unit('m/(s**2)'))
+	case.atmosphere(filename=jupiter_pt(), delim_whitespace=True)
+	profile = case.inputs['atmosphere']['profile'].copy()
+
+	atm = setup_atmosphere(case.inputs, opas[0])
+	perror = pd.DataFrame(index=range(nsteps), columns=['opacity_class','molecular','continuum'])
+	for i in range(nsteps):
+		#heat a random block of levels and update with alternating opacity classes
+		temperature = atm.level['temperature'].copy()
+		start = rng.randint(0, len(temperature)-5)
+		temperature[start:start+5] *= rng.uniform(0.7, 1.3)
+		opa = opas[i % 2]
+
+		#set up another atmosphere with the same class in between, as a retrieval would 
+		if i % 3 == 2: 
+			setup_atmosphere(case.inputs, opa)
+
+		atm.set_temperature(temperature)
+		atm.update(opa)
+
+		case.inputs['atmosphere']['profile'] = profile.assign(temperature=temperature)
+		setup_atmosphere(case.inputs, fresh)
+		perror.loc[i] = [i % 2, 
+			max(np.max(100*np.abs(opa.molecular_opa[m]-fresh.molecular_opa[m])/fresh.molecular_opa[m].max()) 
+				for m in fresh.molecular_opa), 
+			max(np.max(100*np.abs(opa.continuum_opa[m]-fresh.continuum_opa[m])/np.abs(fresh.continuum_opa[m]).max()) 
+				for m in fresh.continuum_opa)]
+	return perror
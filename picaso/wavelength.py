@@ -41,28 +41,62 @@ def get_cld_input_grid(filename_or_grid):
 
 	return grid
 
-def regrid(matrix, old_wno, new_wno):
+def get_regrid_weights(old_wno, new_wno):
 	"""
-	This takes in a matrix that is (number of something versus number of wavelength points) and regrids 
-	to a new wave grid. 
+	Computes the linear interpolation indices and weights from one wave grid to another, so the
+	same regridding can be applied to many matrices at once (see `regrid`). Points off the ends
+	of the old grid take the closest end value, like `np.interp`.
+
+	Parameters
+	----------
+	old_wno : array
+		array that represents the old wavelength grid, in increasing order
+	new_wno : array
+		array that represents the desired wavelength grid
+
+	Returns
+	-------
+	tuple
+		For every point of the new grid : the index of the old grid point below it, the index
+		of the one above it, the distance to the point below and the spacing between the two
+	"""
+	old_wno = np.asarray(old_wno, dtype=float)
+	new_wno = np.asarray(new_wno, dtype=float)
+	n = len(old_wno)
+	below = np.clip(np.searchsorted(old_wno, new_wno, side='right') - 1, 0, n-1)
+	above = np.minimum(below + 1, n-1)
+	offset = np.clip(new_wno, old_wno[0], old_wno[-1]) - old_wno[below]
+	spacing = old_wno[above] - old_wno[below]
+	#past the last point the offset is zero, so any spacing works
+	spacing[below == above] = 1.0
+	return below, above, offset, spacing
+
+def regrid(matrix, old_wno, new_wno, weights=None):
+	"""
+	This takes in a matrix that is (number of something versus number of wavelength points) and regrids
+	to a new wave grid.
 
 	Parameters
 	----------
 	matrix : ndarray
-		matrix that is (number of something versus number of wavelength points)
+		matrix that is (number of something versus number of wavelength points). It can have
+		any number of leading dimensions, as long as wavelength is the last one
 	old_wno : array
-		array that represents the old wavelength grid of the matrix 
+		array that represents the old wavelength grid of the matrix
 	new_wno : array
-		array that represents the desired wavelength grid 
+		array that represents the desired wavelength grid
+	weights : tuple
+		(Optional) Output of `get_regrid_weights(old_wno, new_wno)`, to avoid recomputing
+		it when regridding several matrices
 
 	Returns
 	-------
-	matrix 
-		matrix that has been reinterpolated to new wave number grid 
+	matrix
+		matrix that has been reinterpolated to new wave number grid
 	"""
-	new = np.zeros((matrix.shape[0],len(new_wno)))
-	for i in range(matrix.shape[0]): 
-		new[i, :] = np.interp(new_wno, old_wno, matrix[i,:])
-		#f = sci.interp1d(old_wno, matrix[i,:],kind='cubic')
-		#new[i, :] = f(new_wno)
-	return new
\ No newline at end of file
+	if weights is None:
+		weights = get_regrid_weights(old_wno, new_wno)
+	below, above, offset, spacing = weights
+	#same operations, in the same order, as np.interp so the results are identical
+	slope = (matrix[...,above] - matrix[...,below]) / spacing
+	return slope*offset + matrix[...,below]
\ No newline at end of file
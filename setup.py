@@ -70,5 +70,8 @@ setup(
           'sphinx',
           'scipy',
           ], 
+    entry_points = {
+          'console_scripts': ['picaso-warmup=picaso.precompile:main'],
+    },
     zip_safe = False,
 )